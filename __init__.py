@@ -32,6 +32,14 @@ bl_info = {
 
 import imp
 
+from . import lumiere_cache
+imp.reload(lumiere_cache)
+from . import lumiere_placement
+imp.reload(lumiere_placement)
+from . import lumiere_sun
+imp.reload(lumiere_sun)
+from . import lumiere_presets
+imp.reload(lumiere_presets)
 from . import lumiere_ui
 imp.reload(lumiere_ui)
 from . import lumiere_materials
@@ -60,15 +68,21 @@ Lumiere_presets = os.path.join(presets_folder[0], 'object', 'Lumiere_presets')
 
 
 def register():
+	lumiere_presets.register()
+	lumiere_cache.register()
 	lumiere_gizmo.register()
 	lumiere_op.register()
 	lumiere_ui.register()
+	lumiere_draw.register()
 	print("Registered Lumiere")
 
 def unregister():
+	lumiere_draw.unregister()
 	lumiere_ui.unregister()
 	lumiere_op.unregister()
 	lumiere_gizmo.unregister()
+	lumiere_cache.unregister()
+	lumiere_presets.unregister()
 	print("Unregistered Lumiere")
 
 	
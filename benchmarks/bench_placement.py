@@ -0,0 +1,338 @@
+"""Benchmark of the light placement code of Lumiere.
+
+Build synthetic scenes, replay a mouse path through raycast_light and time the
+placement updates. Run it from a factory startup Blender without the add-on
+enabled, the add-on is loaded from this repository :
+
+	blender --background --factory-startup --python benchmarks/bench_placement.py -- \\
+		--sizes 10,1000,50000 --output bench.json
+
+Compare two runs :
+
+	blender --background --factory-startup --python benchmarks/bench_placement.py -- \\
+		--output new.json --compare old.json
+"""
+
+import bpy
+import bmesh
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import importlib.util
+import numpy as np
+
+from math import (
+	radians,
+	sin,
+	tan,
+	pi,
+	)
+from mathutils import (
+	Vector,
+	Matrix,
+	)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "Lumiere"
+
+# -------------------------------------------------------------------- #
+## Setup
+
+def load_lumiere():
+	"""Import and register the add-on from the repository"""
+	if PACKAGE in sys.modules and hasattr(bpy.types.Object, "Lumiere"):
+		return sys.modules[PACKAGE]
+
+	spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"),
+		submodule_search_locations=[ROOT])
+	lumiere = importlib.util.module_from_spec(spec)
+	sys.modules[PACKAGE] = lumiere
+	spec.loader.exec_module(lumiere)
+	lumiere.register()
+	return lumiere
+
+def parse_args():
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+	parser = argparse.ArgumentParser(prog="bench_placement.py")
+	parser.add_argument("--sizes", default="10,1000,10000,50000",
+		help="Comma separated number of objects or instances")
+	parser.add_argument("--subdivisions", default="1,3",
+		help="Comma separated icosphere subdivisions of the meshes (1 = 80 faces, 3 = 1280 faces)")
+	parser.add_argument("--modes", default="Accurate",
+		help="Comma separated reflect modes to replay")
+	parser.add_argument("--no-instances", action="store_true",
+		help="Skip the instanced scenes")
+	parser.add_argument("--events", type=int, default=200,
+		help="Number of mouse events of the generated path")
+	parser.add_argument("--path", default="",
+		help="JSON file with a recorded mouse path, a list of [x, y] region coordinates")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", default="",
+		help="JSON file of the results, printed if empty")
+	parser.add_argument("--compare", default="",
+		help="JSON file of a previous run to compare with")
+	return parser.parse_args(argv)
+
+# -------------------------------------------------------------------- #
+## Synthetic scenes
+
+def ico_mesh(subdivisions):
+	bm = bmesh.new()
+	try:
+		bmesh.ops.create_icosphere(bm, subdivisions=subdivisions, radius=0.5)
+	except TypeError:
+		# Blender < 3.0
+		bmesh.ops.create_icosphere(bm, subdivisions=subdivisions, diameter=0.5)
+	mesh = bpy.data.meshes.new("bench_ico_%d" % subdivisions)
+	bm.to_mesh(mesh)
+	bm.free()
+	return mesh
+
+def build_scene(count, instanced, subdivisions, seed):
+	"""Scatter count spheres over a ground plane, as objects or as vertex instances"""
+
+	bpy.ops.wm.read_homefile(use_empty=True)
+	scene = bpy.context.scene
+	rnd = random.Random(seed)
+	spread = max(10.0, 2.0 * count ** 0.5)
+
+	ground = bpy.data.meshes.new("bench_ground")
+	ground.from_pydata([(-spread, -spread, 0), (spread, -spread, 0), (spread, spread, 0), (-spread, spread, 0)], [], [(0, 1, 2, 3)])
+	scene.collection.objects.link(bpy.data.objects.new("bench_ground", ground))
+
+	mesh = ico_mesh(subdivisions)
+	coords = [(rnd.uniform(-spread, spread), rnd.uniform(-spread, spread), rnd.uniform(0.5, 2.0)) for i in range(count)]
+
+	if instanced:
+		points = bpy.data.meshes.new("bench_points")
+		points.vertices.add(count)
+		points.vertices.foreach_set("co", [c for co in coords for c in co])
+		emitter = bpy.data.objects.new("bench_emitter", points)
+		emitter.instance_type = 'VERTS'
+		scene.collection.objects.link(emitter)
+		source = bpy.data.objects.new("bench_source", mesh)
+		scene.collection.objects.link(source)
+		source.parent = emitter
+	else:
+		for i, co in enumerate(coords):
+			obj = bpy.data.objects.new("bench_%d" % i, mesh)
+			obj.location = co
+			scene.collection.objects.link(obj)
+
+	collection = bpy.data.collections.new("Lumiere")
+	scene.collection.children.link(collection)
+	light = bpy.data.objects.new("bench_light", bpy.data.lights.new("bench_light", 'AREA'))
+	collection.objects.link(light)
+	bpy.context.view_layer.objects.active = light
+	bpy.context.view_layer.update()
+
+	return scene, light, spread
+
+# -------------------------------------------------------------------- #
+## Virtual 3d view
+
+class BenchRegion:
+	"""Stand-in for the 3d view region, enough for bpy_extras.view3d_utils"""
+	width = 1920
+	height = 1080
+
+class BenchView:
+	"""Stand-in for the region data of a perspective 3d view"""
+
+	is_perspective = True
+
+	def __init__(self, eye, target, fov=radians(60.0)):
+		rotation = (eye - target).to_track_quat('Z', 'Y').to_matrix().to_4x4()
+		self.view_matrix = (Matrix.Translation(eye) @ rotation).inverted()
+
+		aspect = BenchRegion.width / BenchRegion.height
+		near, far = 0.1, 10000.0
+		f = 1.0 / tan(fov / 2.0)
+		self.window_matrix = Matrix((
+			(f / aspect, 0, 0, 0),
+			(0, f, 0, 0),
+			(0, 0, (far + near) / (near - far), 2 * far * near / (near - far)),
+			(0, 0, -1, 0),
+			))
+		self.perspective_matrix = self.window_matrix @ self.view_matrix
+
+class BenchContext:
+	"""Context given to the placement code, as seen from a 3d view"""
+
+	def __init__(self, light):
+		self.region = BenchRegion()
+		self.region_data = None
+		self.active_object = light
+		self.object = light
+		self.scene = bpy.context.scene
+		self.view_layer = bpy.context.view_layer
+
+	def evaluated_depsgraph_get(self):
+		return bpy.context.evaluated_depsgraph_get()
+
+class BenchOperator:
+	"""Modal operator state read by raycast_light"""
+	shift = False
+
+def mouse_path(args):
+	"""Recorded path if given, else a Lissajous curve over the region"""
+	if args.path:
+		with open(args.path, 'r', encoding='utf-8') as file:
+			return [tuple(coord) for coord in json.load(file)]
+
+	w, h = BenchRegion.width, BenchRegion.height
+	return [(w * (0.5 + 0.45 * sin(3 * t)), h * (0.5 + 0.45 * sin(2 * t + pi / 4)))
+		for t in np.linspace(0.0, 2 * pi, args.events)]
+
+# -------------------------------------------------------------------- #
+## Measures
+
+def stats(samples):
+	"""Latency percentiles in milliseconds"""
+	values = np.array(samples) * 1000.0
+	if len(values) == 0:
+		return {"count": 0}
+	return {
+		"count": len(values),
+		"mean_ms": float(values.mean()),
+		"p50_ms": float(np.percentile(values, 50)),
+		"p90_ms": float(np.percentile(values, 90)),
+		"p99_ms": float(np.percentile(values, 99)),
+		"max_ms": float(values.max()),
+		}
+
+def max_rss_kb():
+	try:
+		import resource
+	except ImportError:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Bytes on macOS, kilobytes on Linux
+	return rss // 1024 if sys.platform == "darwin" else rss
+
+def run_case(lumiere, count, instanced, subdivisions, mode, path, seed):
+	lumiere_utils = lumiere.lumiere_utils
+	lumiere_ui = lumiere.lumiere_ui
+	lumiere_cache = lumiere.lumiere_cache
+
+	start = time.perf_counter()
+	scene, light, spread = build_scene(count, instanced, subdivisions, seed)
+	scene_time = time.perf_counter() - start
+
+	context = BenchContext(light)
+	context.region_data = BenchView(Vector((0.0, -spread * 1.2, spread * 0.8)), Vector((0.0, 0.0, 0.0)))
+	operator = BenchOperator()
+	light.Lumiere.reflect_angle = mode
+
+	# Same state as the interactive mode
+	scene.is_running = True
+
+	tracemalloc.start()
+	start = time.perf_counter()
+	scene_bvh = lumiere_cache.get_scene_bvh(scene)
+	scene_bvh.build(context)
+	build_time = time.perf_counter() - start
+	cache_peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	placement = []
+	for coord in path:
+		start = time.perf_counter()
+		lumiere_utils.raycast_light(operator, coord, context, light.Lumiere.range)
+		placement.append(time.perf_counter() - start)
+
+	spherical = []
+	shadow = []
+	ranges = []
+	for i in range(len(path)):
+		light.Lumiere["rotation"] = (i * 7.0) % 360.0
+		start = time.perf_counter()
+		lumiere_ui.update_spherical_coordinate(None, context, light)
+		spherical.append(time.perf_counter() - start)
+
+		start = time.perf_counter()
+		lumiere_utils.update_shadow(context, light, light.parent)
+		shadow.append(time.perf_counter() - start)
+
+		start = time.perf_counter()
+		light.Lumiere.range = 1.0 + (i % 10)
+		ranges.append(time.perf_counter() - start)
+
+	scene.is_running = False
+
+	return {
+		"name": "%s_%d_sub%d_%s" % ("instances" if instanced else "objects", count, subdivisions, mode),
+		"objects": count,
+		"instanced": instanced,
+		"subdivisions": subdivisions,
+		"faces": len(bpy.data.meshes["bench_ico_%d" % subdivisions].polygons),
+		"reflect_angle": mode,
+		"events": len(path),
+		"scene_build_s": scene_time,
+		"cache_build_s": build_time,
+		"raycast_light": stats(placement),
+		"update_spherical_coordinate": stats(spherical),
+		"update_shadow": stats(shadow),
+		"update_range": stats(ranges),
+		"memory": {
+			"cache_build_peak_kb": cache_peak // 1024,
+			"cache_arrays_kb": (scene_bvh.matrices.nbytes + scene_bvh.inverses.nbytes + scene_bvh.bounds.nbytes) // 1024,
+			"max_rss_kb": max_rss_kb(),
+			},
+		}
+
+def compare(results, previous):
+	"""Print the ratio of the latencies with a previous run, > 1 is slower"""
+	old_cases = {case["name"]: case for case in previous["cases"]}
+	print("\n%-40s %-28s %10s %10s" % ("case", "measure", "p50", "p99"))
+	for case in results["cases"]:
+		old = old_cases.get(case["name"])
+		if old is None:
+			continue
+		for measure in ("raycast_light", "update_spherical_coordinate", "update_shadow", "update_range"):
+			new_stats, old_stats = case[measure], old[measure]
+			if not old_stats.get("count") or not new_stats.get("count"):
+				continue
+			print("%-40s %-28s %9.2fx %9.2fx" % (case["name"], measure,
+				new_stats["p50_ms"] / max(old_stats["p50_ms"], 1e-9),
+				new_stats["p99_ms"] / max(old_stats["p99_ms"], 1e-9)))
+
+# -------------------------------------------------------------------- #
+def main():
+	args = parse_args()
+	lumiere = load_lumiere()
+	path = mouse_path(args)
+
+	results = {
+		"blender": bpy.app.version_string,
+		"lumiere": ".".join(str(v) for v in lumiere.bl_info["version"]),
+		"numpy": np.__version__,
+		"cases": [],
+		}
+
+	for count in (int(size) for size in args.sizes.split(",")):
+		for instanced in ((False,) if args.no_instances else (False, True)):
+			for subdivisions in (int(sub) for sub in args.subdivisions.split(",")):
+				for mode in args.modes.split(","):
+					case = run_case(lumiere, count, instanced, subdivisions, mode, path, args.seed)
+					results["cases"].append(case)
+					print("%-40s raycast_light p50 %.3f ms p99 %.3f ms" % (case["name"],
+						case["raycast_light"].get("p50_ms", 0.0), case["raycast_light"].get("p99_ms", 0.0)))
+
+	output = json.dumps(results, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as file:
+			file.write(output)
+	else:
+		print(output)
+
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as file:
+			compare(results, json.load(file))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,283 @@
+"""Accuracy and throughput of the solar ephemeris of Lumiere.
+
+Runs with a plain Python and NumPy, lumiere_sun is loaded from this
+repository without Blender :
+
+	python benchmarks/bench_sun.py --output sun.json
+
+The sun of getSunPosition, getSunPositions and SunCache is checked against
+sun_reference.csv, a table of azimuths and elevations across latitudes and
+dates. The exit code is 1 when an error is over the tolerance, so a faster
+version of the solar code can be proven to keep the same accuracy.
+
+The table was computed offline with the PSA algorithm (Blanco-Muriel et al.,
+2001), an independent algorithm accurate to about 0.01 degree between 1999
+and 2015. It is written again with :
+
+	python benchmarks/bench_sun.py --write-reference
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import importlib.util
+import numpy as np
+
+from math import (
+	radians,
+	degrees,
+	sin,
+	cos,
+	tan,
+	asin,
+	acos,
+	atan2,
+	pi,
+	)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sun_reference.csv")
+
+# Reference julian days at 0h, from Meeus, Astronomical Algorithms, chapter 7
+JULIAN_DAYS = [
+	((2000, 1, 1), 2451544.5),
+	((1999, 1, 1), 2451179.5),
+	((1987, 1, 27), 2446822.5),
+	((1988, 1, 27), 2447187.5),
+	((1900, 1, 1), 2415020.5),
+	((1600, 1, 1), 2305447.5),
+	((1600, 12, 31), 2305812.5),
+	]
+
+# -------------------------------------------------------------------- #
+## Setup
+
+def load_sun():
+	"""Import lumiere_sun from the repository, it does not depend on bpy"""
+	spec = importlib.util.spec_from_file_location("lumiere_sun", os.path.join(ROOT, "lumiere_sun.py"))
+	sun = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(sun)
+	return sun
+
+def parse_args():
+	parser = argparse.ArgumentParser(prog="bench_sun.py")
+	parser.add_argument("--tolerance", type=float, default=0.05,
+		help="Maximum angle in degrees between the sun and the reference")
+	parser.add_argument("--cache-tolerance", type=float, default=0.1,
+		help="Maximum angle in degrees for the interpolated SunCache")
+	parser.add_argument("--calls", type=int, default=20000,
+		help="Number of sun positions of the throughput benchmark")
+	parser.add_argument("--write-reference", action="store_true",
+		help="Compute the reference table again and exit")
+	parser.add_argument("--output", default="",
+		help="JSON file of the results, printed if empty")
+	parser.add_argument("--compare", default="",
+		help="JSON file of a previous run to compare with")
+	return parser.parse_args()
+
+# -------------------------------------------------------------------- #
+## Reference
+
+def psa_sun_position(year, month, day, hour, latitude, longitude):
+	"""Azimuth (from the north, clockwise) and elevation of the sun in degrees.
+	PSA algorithm, hour in UT, longitude positive to the east"""
+
+	# Julian day, with the integer divisions of the original C code
+	aux1 = int((month - 14) / 12)
+	aux2 = (int(1461 * (year + 4800 + aux1) / 4) + int(367 * (month - 2 - 12 * aux1) / 12) -
+		int(3 * int((year + 4900 + aux1) / 100) / 4) + day - 32075)
+	n = aux2 - 0.5 + hour / 24.0 - 2451545.0
+
+	# Ecliptic coordinates
+	omega = 2.1429 - 0.0010394594 * n
+	mean_longitude = 4.8950630 + 0.017202791698 * n
+	mean_anomaly = 6.2400600 + 0.0172019699 * n
+	ecliptic_longitude = (mean_longitude + 0.03341607 * sin(mean_anomaly) + 0.00034894 * sin(2 * mean_anomaly) -
+		0.0001134 - 0.0000203 * sin(omega))
+	obliquity = 0.4090928 - 6.2140e-9 * n + 0.0000396 * cos(omega)
+
+	# Celestial coordinates
+	right_ascension = atan2(cos(obliquity) * sin(ecliptic_longitude), cos(ecliptic_longitude))
+	if right_ascension < 0.0:
+		right_ascension += 2 * pi
+	declination = asin(sin(obliquity) * sin(ecliptic_longitude))
+
+	# Local coordinates
+	gmst = 6.6974243242 + 0.0657098283 * n + hour
+	hour_angle = radians(gmst * 15 + longitude) - right_ascension
+	lat = radians(latitude)
+	zenith = acos(cos(lat) * cos(hour_angle) * cos(declination) + sin(declination) * sin(lat))
+	azimuth = atan2(-sin(hour_angle), tan(declination) * cos(lat) - sin(lat) * cos(hour_angle))
+	if azimuth < 0.0:
+		azimuth += 2 * pi
+
+	# Parallax
+	zenith += (6371.01 / 149597890.0) * sin(zenith)
+
+	return degrees(azimuth), 90.0 - degrees(zenith)
+
+def write_reference():
+	rows = []
+	for year, month, day in ((1999, 3, 20), (2003, 6, 21), (2007, 9, 23), (2010, 12, 21), (2012, 2, 14), (2015, 8, 5)):
+		for latitude in (-80.0, -60.0, -45.0, -23.44, 0.0, 23.44, 45.0, 60.0, 80.0):
+			for longitude in (-120.0, 0.0, 2.67, 135.0):
+				for hour in (0.0, 3.5, 6.0, 9.25, 12.0, 15.75, 18.0, 21.0):
+					azimuth, elevation = psa_sun_position(year, month, day, hour, latitude, longitude)
+					rows.append((year, month, day, hour, latitude, longitude, "%.6f" % azimuth, "%.6f" % elevation))
+
+	with open(REFERENCE, 'w', newline='', encoding='utf-8') as file:
+		writer = csv.writer(file)
+		writer.writerow(("year", "month", "day", "hour", "latitude", "longitude", "azimuth", "elevation"))
+		writer.writerows(rows)
+	print("%d rows written to %s" % (len(rows), REFERENCE))
+
+def read_reference():
+	with open(REFERENCE, 'r', newline='', encoding='utf-8') as file:
+		rows = list(csv.DictReader(file))
+	return {key: np.array([float(row[key]) for row in rows]) for key in rows[0]}
+
+# -------------------------------------------------------------------- #
+## Accuracy
+
+def directions(azimuths, elevations):
+	"""Unit vectors of azimuths and elevations in degrees"""
+	az = np.radians(azimuths)
+	el = np.radians(elevations)
+	return np.stack((np.sin(az) * np.cos(el), np.cos(az) * np.cos(el), np.sin(el)), axis=1)
+
+def angles(a, b):
+	"""Angles in degrees between the rows of two arrays of unit vectors"""
+	return np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1.0, 1.0)))
+
+def rotations_to_directions(rotations):
+	"""Sun rotations of Lumiere to unit vectors, north offset at 0"""
+	rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3)
+	return directions(-np.degrees(rotations[:, 2]), np.degrees(rotations[:, 0]) + 90.0)
+
+def error_stats(errors):
+	return {
+		"count": int(len(errors)),
+		"max_deg": float(errors.max()),
+		"mean_deg": float(errors.mean()),
+		}
+
+def check_accuracy(sun, table, args):
+	"""Angles between the sun of each code path and the reference"""
+	reference = directions(table["azimuth"], table["elevation"])
+	rows = zip(*(table[key] for key in ("year", "month", "day", "hour", "latitude", "longitude")))
+	failures = []
+
+	scalar = []
+	locations = []
+	for year, month, day, hour, latitude, longitude in rows:
+		location, rotation = sun.getSunPosition(localTime = hour, latitude = latitude, longitude = longitude, northOffset = 0.00, utcZone = 0, month = int(month), day = int(day), year = int(year), distance = 1)
+		scalar.append(rotation)
+		locations.append(location)
+	scalar = rotations_to_directions(scalar)
+
+	batch_locations, batch_rotations = sun.getSunPositions(localTime = table["hour"], latitude = table["latitude"], longitude = table["longitude"], northOffset = 0.00, utcZone = 0, month = table["month"], day = table["day"], year = table["year"], distance = 1)
+	batch = rotations_to_directions(batch_rotations)
+
+	cache = sun.SunCache()
+	cached = rotations_to_directions([cache.rotation(hour, latitude, longitude, year, month, day)
+		for year, month, day, hour, latitude, longitude in zip(*(table[key] for key in ("year", "month", "day", "hour", "latitude", "longitude")))])
+
+	results = {
+		"getSunPosition": error_stats(angles(scalar, reference)),
+		"getSunPositions": error_stats(angles(batch, reference)),
+		"SunCache": error_stats(angles(cached, reference)),
+		# The location must be the sun direction at the given distance
+		"setSunPosition": {"max": float(np.abs(np.array(locations) - sun.sun_directions(batch_rotations)).max())},
+		"getJulianDay": {"max": max(abs(sun.getJulianDay(*date) - jd) for date, jd in JULIAN_DAYS)},
+		}
+
+	for name in ("getSunPosition", "getSunPositions"):
+		if results[name]["max_deg"] > args.tolerance:
+			failures.append("%s is %.4f degrees from the reference" % (name, results[name]["max_deg"]))
+	if results["SunCache"]["max_deg"] > args.cache_tolerance:
+		failures.append("SunCache is %.4f degrees from the reference" % results["SunCache"]["max_deg"])
+	if results["setSunPosition"]["max"] > 1e-9:
+		failures.append("setSunPosition does not match the sun rotation")
+	if results["getJulianDay"]["max"] != 0.0:
+		failures.append("getJulianDay is %g days off" % results["getJulianDay"]["max"])
+
+	return results, failures
+
+# -------------------------------------------------------------------- #
+## Throughput
+
+def rate(function, count):
+	"""Sun positions per second of a function computing count positions"""
+	start = time.perf_counter()
+	function()
+	return count / max(time.perf_counter() - start, 1e-9)
+
+def throughput(sun, calls):
+	hours = np.linspace(0.0, 23.59, calls)
+
+	def scalar():
+		for hour in hours.tolist():
+			sun.getSunPosition(localTime = hour, latitude = 48.87, longitude = 2.67, northOffset = 0.00, utcZone = 0, month = 6, day = 21, year = 2020, distance = 1)
+
+	def batch():
+		sun.getSunPositions(localTime = hours, latitude = 48.87, longitude = 2.67, northOffset = 0.00, utcZone = 0, month = 6, day = 21, year = 2020, distance = 1)
+
+	def small_batches():
+		for chunk in np.array_split(hours, max(calls // 100, 1)):
+			sun.getSunPositions(localTime = chunk, latitude = 48.87, longitude = 2.67, northOffset = 0.00, utcZone = 0, month = 6, day = 21, year = 2020, distance = 1)
+
+	cache = sun.SunCache()
+	def cached():
+		for hour in hours.tolist():
+			cache.position(hour, 48.87, 2.67, 2020, 6, 21)
+
+	return {
+		"getSunPosition_per_s": rate(scalar, calls),
+		"getSunPositions_per_s": rate(batch, calls),
+		"getSunPositions_100_per_s": rate(small_batches, calls),
+		"SunCache_per_s": rate(cached, calls),
+		}
+
+def compare(results, previous):
+	"""Print the ratio of the throughputs with a previous run, > 1 is faster"""
+	print("\n%-28s %10s" % ("measure", "speedup"))
+	for name, value in sorted(results["throughput"].items()):
+		if name in previous.get("throughput", {}):
+			print("%-28s %9.2fx" % (name, value / max(previous["throughput"][name], 1e-9)))
+
+# -------------------------------------------------------------------- #
+def main():
+	args = parse_args()
+	if args.write_reference:
+		write_reference()
+		return 0
+
+	sun = load_sun()
+	accuracy, failures = check_accuracy(sun, read_reference(), args)
+	results = {
+		"python": sys.version.split()[0],
+		"numpy": np.__version__,
+		"accuracy": accuracy,
+		"throughput": throughput(sun, args.calls),
+		}
+
+	output = json.dumps(results, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as file:
+			file.write(output)
+	else:
+		print(output)
+
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as file:
+			compare(results, json.load(file))
+
+	for failure in failures:
+		print("FAILED: " + failure)
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,83 @@
+"""Check the softboxes built from the template mesh of Lumiere.
+
+Two softboxes built in a row must each have their own copy of the mesh
+and their own material. Run it from a factory startup Blender without the add-on
+enabled, the add-on is loaded from this repository :
+
+	blender --background --factory-startup --python benchmarks/check_softbox.py
+
+The exit code is 1 when a check fails.
+"""
+
+import bpy
+import os
+import sys
+import time
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "Lumiere"
+
+# -------------------------------------------------------------------- #
+## Setup
+
+def load_lumiere():
+	"""Import and register the add-on from the repository"""
+	if PACKAGE in sys.modules and hasattr(bpy.types.Object, "Lumiere"):
+		return sys.modules[PACKAGE]
+
+	spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"),
+		submodule_search_locations=[ROOT])
+	lumiere = importlib.util.module_from_spec(spec)
+	sys.modules[PACKAGE] = lumiere
+	spec.loader.exec_module(lumiere)
+	lumiere.register()
+	return lumiere
+
+# -------------------------------------------------------------------- #
+## Checks
+
+def check_softboxes(lumiere):
+	failures = []
+	new_softbox = lumiere.lumiere_lights.new_softbox
+
+	start = time.perf_counter()
+	first = new_softbox("Lumiere check A")
+	second = new_softbox("Lumiere check B")
+	elapsed = (time.perf_counter() - start) / 2
+	print("Softbox built in %.3f ms" % (elapsed * 1000))
+
+	if first.data == second.data:
+		failures.append("the softboxes share their mesh")
+	if first.data.name == lumiere.lumiere_lights.SOFTBOX_MESH:
+		failures.append("a softbox uses the template mesh")
+	if first.active_material is None or first.active_material == second.active_material:
+		failures.append("the softboxes share their material")
+	if first.data.materials[0] is not None:
+		failures.append("a material is linked to the mesh")
+
+	# Editing one mesh must not change the other softbox
+	second.data.vertices[0].co.x = -1.0
+	if first.data.vertices[0].co.x == -1.0:
+		failures.append("the mesh of a softbox changed with the other one")
+
+	# Editing one material must not change the other softbox
+	second.active_material.node_tree.nodes["Emit color"].inputs[0].default_value = (1, 0, 0, 1)
+	if tuple(first.active_material.node_tree.nodes["Emit color"].inputs[0].default_value) == (1, 0, 0, 1):
+		failures.append("the material of a softbox changed with the other one")
+
+	return failures
+
+# -------------------------------------------------------------------- #
+def main():
+	lumiere = load_lumiere()
+	failures = check_softboxes(lumiere)
+
+	for failure in failures:
+		print("FAILED: " + failure)
+	if not failures:
+		print("All the checks passed")
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
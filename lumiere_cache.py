@@ -0,0 +1,499 @@
+import bpy
+import numpy as np
+
+from bpy.app.handlers import persistent
+from mathutils import (
+	Vector,
+	Matrix,
+	)
+from mathutils.bvhtree import BVHTree
+
+# -------------------------------------------------------------------- #
+def ray_boxes(bounds, origin, direction, distance=np.inf):
+	"""Slab test of a ray against a (N, 2, 3) array of boxes. The origin and
+	direction are one vector, or one row per box when each box has its own space.
+	Return the indices of the boxes hit sorted by entry distance, and the entry distances"""
+
+	direction = np.asarray(direction, dtype=np.float64)
+	direction = np.where(np.abs(direction) < 1e-12, 1e-12, direction)
+	inv_dir = 1.0 / direction
+	origin = np.asarray(origin, dtype=np.float64)
+
+	t0 = (bounds[:, 0, :] - origin) * inv_dir
+	t1 = (bounds[:, 1, :] - origin) * inv_dir
+	t_enter = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+	t_exit = np.maximum(t0, t1).min(axis=1)
+
+	hit = np.flatnonzero((t_exit >= t_enter) & (t_enter <= distance))
+	order = hit[np.argsort(t_enter[hit], kind='stable')]
+
+	return order, t_enter[order]
+
+# -------------------------------------------------------------------- #
+class MeshEntry:
+	"""Local BVH tree and bounding box of one evaluated mesh, shared by the
+	objects using the same mesh datablock and all their instances"""
+
+	def __init__(self, name):
+		# Object evaluated to build the tree
+		self.name = name
+		self.tree = None
+		self.bbox = None
+		self.center = None
+
+	def set_bbox(self, bound_box):
+		"""Local axis aligned bounding box, padded to never be flat"""
+		corners = np.array([tuple(b) for b in bound_box], dtype=np.float64)
+		box_min = corners.min(axis=0)
+		box_max = corners.max(axis=0)
+		pad = 1e-4 * (1.0 + np.linalg.norm(box_max - box_min))
+		self.bbox = np.array((box_min - pad, box_max + pad))
+		self.center = Vector(corners.mean(axis=0))
+
+
+def invert_matrices(matrices):
+	"""Inverse of a (N, 4, 4) array of matrices, the singular ones are zeroed"""
+	try:
+		return np.linalg.inv(matrices)
+	except np.linalg.LinAlgError:
+		inverses = np.zeros_like(matrices)
+		for i, matrix in enumerate(matrices):
+			try:
+				inverses[i] = np.linalg.inv(matrix)
+			except np.linalg.LinAlgError:
+				pass
+		return inverses
+
+def mesh_key(obj):
+	"""Key of the tree of an object : its mesh datablock, or the object
+	itself when modifiers make its evaluated geometry its own"""
+	obj = obj.original
+	if len(obj.modifiers) or obj.data is None:
+		return ('OBJECT', obj.name)
+	return ('MESH', obj.data.name)
+
+# -------------------------------------------------------------------- #
+class SceneBVH:
+	"""Ray acceleration structure over the meshes of the scene.
+
+	Each mesh gets one BVH tree in local space, built on demand from the
+	evaluated mesh and shared by the linked duplicates and all the instances
+	using it, the objects with modifiers get their own. Every instance (the
+	objects themselves and the duplis) is one row of a (N, 4, 4) array
+	of world matrices, so a ray is brought in the local space of all the
+	instances and tested against their boxes in a single vectorized pass
+	before any tree is used.
+	"""
+
+	def __init__(self):
+		self.meshes = {}
+		self.mesh_index = {}
+		# Mesh key of each object name
+		self.object_keys = {}
+		self.names = []
+		self.row_names = np.zeros(0, dtype=object)
+		self.keys = np.zeros(0, dtype=int)
+		self.rows = {}
+		self.matrices = np.zeros((0, 4, 4))
+		self.inverses = np.zeros((0, 4, 4))
+		self.bounds = np.zeros((0, 2, 3))
+		self.instancers = set()
+		self.instanced = set()
+		self.moved = set()
+		self.stale = True
+
+	def clear(self):
+		self.__init__()
+
+	def build(self, context):
+		"""Collect the meshes and the instances of the scene"""
+		self.clear()
+		self.sync(context)
+
+	def sync(self, context):
+		"""Rebuild the instance arrays, keep the trees of the known meshes"""
+		if not self.stale:
+			return
+
+		depsgraph = context.evaluated_depsgraph_get()
+		names = []
+		keys = []
+		matrices = []
+		rows = {}
+		object_keys = {}
+		instancers = set()
+		instanced = set()
+
+		for dup in depsgraph.object_instances:
+			if dup.is_instance:
+				obj = dup.instance_object
+				if obj.type != 'MESH':
+					continue
+				name = obj.original.name
+				instancers.add(dup.parent.original.name)
+				instanced.add(name)
+			else:
+				obj = dup.object
+				if obj.type != 'MESH':
+					continue
+				name = obj.original.name
+				rows[name] = len(names)
+
+			key = object_keys.get(name)
+			if key is None:
+				key = object_keys[name] = mesh_key(obj)
+			mesh = self.meshes.get(key)
+			if mesh is None:
+				mesh = self.meshes[key] = MeshEntry(name)
+			# Any object of the mesh can be evaluated, the first one may be removed
+			mesh.name = name
+			if mesh.bbox is None:
+				mesh.set_bbox(obj.bound_box)
+
+			names.append(name)
+			keys.append(key)
+			matrices.append(np.array(dup.matrix_world, dtype=np.float64))
+
+		for key in set(self.meshes) - set(keys):
+			del self.meshes[key]
+
+		self.mesh_index = {key: i for i, key in enumerate(self.meshes)}
+		self.object_keys = object_keys
+		self.names = names
+		self.row_names = np.array(names, dtype=object)
+		self.keys = np.array([self.mesh_index[key] for key in keys], dtype=int)
+		self.rows = rows
+		self.matrices = np.array(matrices, dtype=np.float64).reshape(-1, 4, 4)
+		self.inverses = invert_matrices(self.matrices)
+		self.bounds = np.array([self.meshes[key].bbox for key in keys]).reshape(-1, 2, 3)
+		self.instancers = instancers
+		self.instanced = instanced
+		self.moved.clear()
+		self.stale = False
+
+	def update_rows(self, context):
+		"""Refresh the rows of the objects moved or edited since the last query"""
+		for name in self.moved:
+			mesh = self.get_mesh(name, context, build_tree=False)
+			if mesh is None:
+				continue
+			self.bounds[self.keys == self.mesh_index[self.object_keys[name]]] = mesh.bbox
+			row = self.rows.get(name)
+			if row is not None:
+				matrix = np.array(bpy.data.objects[name].matrix_world, dtype=np.float64)
+				self.matrices[row] = matrix
+				self.inverses[row] = invert_matrices(matrix[None])[0]
+		self.moved.clear()
+
+	def invalidate_geometry(self, name):
+		key = self.object_keys.get(name)
+		obj = bpy.data.objects.get(name)
+		# A modifier added or removed, or a new mesh, moves the object to another tree
+		if key is None or obj is None or mesh_key(obj) != key:
+			self.stale = True
+			return
+		mesh = self.meshes.get(key)
+		if mesh is None:
+			self.stale = True
+		else:
+			mesh.tree = None
+			mesh.bbox = None
+			self.moved.add(name)
+
+	def invalidate_transform(self, name):
+		if name not in self.object_keys or name in self.instanced:
+			# The instances of a collection follow their source objects
+			self.stale = True
+		else:
+			self.moved.add(name)
+
+	def get_mesh(self, name, context, build_tree=True):
+		"""Return the mesh entry of an object with an up to date box and tree"""
+		mesh = self.meshes.get(self.object_keys.get(name))
+		if mesh is None:
+			return None
+
+		if mesh.bbox is None or (build_tree and mesh.tree is None):
+			obj = bpy.data.objects.get(mesh.name)
+			if obj is None:
+				self.stale = True
+				return None
+			depsgraph = context.evaluated_depsgraph_get()
+			obj_eval = obj.evaluated_get(depsgraph)
+			if mesh.bbox is None:
+				mesh.set_bbox(obj_eval.bound_box)
+			if build_tree and mesh.tree is None:
+				mesh.tree = BVHTree.FromObject(obj_eval, depsgraph)
+
+		return mesh
+
+	def update(self, context):
+		self.sync(context)
+		if self.moved:
+			self.update_rows(context)
+			# A removed object was found, collect the scene again
+			self.sync(context)
+
+	def ray_cast(self, context, origin, direction, names=None, exclude=(), distance=1.0e30):
+		"""Return the closest hit as (name, location, normal, face index, distance) or None.
+		The scene is only evaluated when the cache needs to be refreshed"""
+		self.update(context)
+		direction = direction.normalized()
+		best = None
+		best_dist = distance
+
+		if names is not None:
+			rows = np.flatnonzero(np.isin(self.row_names, list(names)))
+		else:
+			rows = np.flatnonzero(~np.isin(self.row_names, list(exclude)))
+		if len(rows) == 0:
+			return None
+
+		# Bring the ray in the local space of every instance. The matrices
+		# are affine so the distances along the ray are the world ones.
+		inverses = self.inverses[rows]
+		origins = np.einsum('nij,j->ni', inverses[:, :3, :3], origin) + inverses[:, :3, 3]
+		directions = np.einsum('nij,j->ni', inverses[:, :3, :3], direction)
+
+		# Test the meshes from the closest box and stop as soon as
+		# a box starts after the closest hit found so far.
+		order, t_enter = ray_boxes(self.bounds[rows], origins, directions, best_dist)
+		for i, t in zip(order, t_enter):
+			if t > best_dist:
+				break
+			row = rows[i]
+			name = self.names[row]
+			mesh = self.get_mesh(name, context)
+			if mesh is None:
+				continue
+			hit, normal, index, _ = mesh.tree.ray_cast(Vector(origins[i]), Vector(directions[i]))
+			if hit is None:
+				continue
+			matrix = Matrix(self.matrices[row])
+			hit_world = matrix @ hit
+			dist = (hit_world - origin).length
+			if dist < best_dist:
+				normal_world = (matrix.to_3x3().inverted_safe().transposed() @ normal).normalized()
+				best = (name, hit_world, normal_world, index, dist)
+				best_dist = dist
+
+		return best
+
+	def object_row(self, name):
+		"""Row of the object, or of its first instance if it is only instanced"""
+		row = self.rows.get(name)
+		if row is None:
+			rows = np.flatnonzero(self.row_names == name)
+			if len(rows):
+				row = rows[0]
+		return row
+
+	def bbox_center(self, context, name):
+		"""Return the world center of the bounding box of an object, or None if not cached"""
+		self.update(context)
+		row = self.rows.get(name)
+		mesh = self.get_mesh(name, context, build_tree=False)
+		if row is None or mesh is None:
+			return None
+		return Matrix(self.matrices[row]) @ mesh.center
+
+	def find_nearest(self, context, name, point):
+		"""Return the closest surface point of an object as (location, normal, face index) or None"""
+		self.update(context)
+		row = self.object_row(name)
+		mesh = self.get_mesh(name, context)
+		if row is None or mesh is None:
+			return None
+		matrix = Matrix(self.matrices[row])
+		hit, normal, index, _ = mesh.tree.find_nearest(Matrix(self.inverses[row]) @ point)
+		if hit is None:
+			return None
+		return (matrix @ hit, (matrix.to_3x3().inverted_safe().transposed() @ normal).normalized(), index)
+
+scene_bvhs = {}
+
+def get_scene_bvh(scene):
+	"""Return the ray cache of a scene"""
+	scene_bvh = scene_bvhs.get(scene.name)
+	if scene_bvh is None:
+		scene_bvh = scene_bvhs[scene.name] = SceneBVH()
+	return scene_bvh
+
+def get_bbox_center(context, obj):
+	"""World center of the bounding box of an object, cached for the meshes"""
+	center = get_scene_bvh(context.scene).bbox_center(context, obj.name)
+	if center is None:
+		center = obj.matrix_world @ (0.125 * sum((Vector(b) for b in obj.bound_box), Vector()))
+	return center
+
+# -------------------------------------------------------------------- #
+class LumiereIndex:
+	"""Membership of the objects in the Lumiere collection of a scene.
+	Objects are stored by pointer so a rename keeps them indexed"""
+
+	def __init__(self):
+		self.pointers = set()
+		self.count = 0
+		self.stale = True
+
+	def sync(self, scene):
+		if not self.stale:
+			return self
+
+		collection = scene.collection.children.get('Lumiere')
+		if collection is None:
+			self.pointers = set()
+			self.count = 0
+		else:
+			self.pointers = {obj.as_pointer() for obj in collection.all_objects}
+			self.count = len(collection.objects)
+		self.stale = False
+		return self
+
+lumiere_indices = {}
+
+def get_lumiere_index(scene):
+	"""Return the up to date Lumiere membership index of a scene"""
+	index = lumiere_indices.get(scene.name)
+	if index is None:
+		index = lumiere_indices[scene.name] = LumiereIndex()
+	return index.sync(scene)
+
+def is_lumiere(scene, obj):
+	"""Check if the object is in the Lumiere collection of the scene"""
+	if obj is None:
+		return False
+	return obj.as_pointer() in get_lumiere_index(scene).pointers
+
+def lumiere_count(scene):
+	"""Number of objects directly in the Lumiere collection of the scene"""
+	return get_lumiere_index(scene).count
+
+def invalidate_lumiere_indices():
+	"""Mark the indices of all the scenes stale after a light is linked or
+	removed, before the depsgraph update reaches lumiere_depsgraph_update"""
+	for index in lumiere_indices.values():
+		index.stale = True
+
+# -------------------------------------------------------------------- #
+@persistent
+def lumiere_depsgraph_update(scene, depsgraph=None):
+	"""Invalidate the cached data of the updated objects"""
+	if depsgraph is None:
+		depsgraph = bpy.context.evaluated_depsgraph_get()
+
+	index = lumiere_indices.get(scene.name)
+	scene_bvh = scene_bvhs.get(scene.name)
+	if index is None and scene_bvh is None:
+		return
+
+	for update in depsgraph.updates:
+		id = update.id
+		if isinstance(id, bpy.types.Collection):
+			if index is not None:
+				index.stale = True
+			if scene_bvh is not None:
+				scene_bvh.stale = True
+		elif scene_bvh is None:
+			continue
+		elif isinstance(id, bpy.types.Object):
+			name = id.original.name
+			# Moving or editing an instancer moves its instances
+			if name in scene_bvh.instancers:
+				scene_bvh.stale = True
+			if id.type != 'MESH':
+				continue
+			if update.is_updated_geometry:
+				scene_bvh.invalidate_geometry(name)
+			elif update.is_updated_transform:
+				scene_bvh.invalidate_transform(name)
+
+# -------------------------------------------------------------------- #
+## World nodes
+# Handles on the nodes of the Lumiere world driven by the sun, read by
+# update_sky and dropped when the world is rebuilt or a file is loaded.
+
+class SkyNodes:
+	"""Sky Texture, Sun normal and Blackbody nodes of the Lumiere world"""
+
+	names = ('Sky Texture', 'Sun normal', 'Blackbody')
+
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		self.sky = self.normal = self.blackbody = None
+		self.tree = None
+		# (index, pointer) of each node in the tree, None if missing
+		self.slots = (None, None, None)
+
+	def valid(self, tree):
+		"""Handles still match the nodes of the tree.
+		The nodes are read through the tree, never through a handle that may be freed"""
+		if tree.as_pointer() != self.tree:
+			return False
+		nodes = tree.nodes
+		for name, slot in zip(self.names, self.slots):
+			if slot is None:
+				if nodes.find(name) >= 0:
+					return False
+				continue
+			index, pointer = slot
+			if index >= len(nodes):
+				return False
+			node = nodes[index]
+			if node.as_pointer() != pointer or node.name != name:
+				return False
+		return True
+
+	def resolve(self, tree):
+		"""Look the nodes up by name"""
+		self.clear()
+		nodes = tree.nodes
+		slots = []
+		for name in self.names:
+			index = nodes.find(name)
+			slots.append(None if index < 0 else (index, nodes[index].as_pointer()))
+		self.slots = tuple(slots)
+		self.sky, self.normal, self.blackbody = (
+			None if slot is None else nodes[slot[0]] for slot in self.slots)
+		self.tree = tree.as_pointer()
+
+	def get(self):
+		"""Return self with valid handles, or None without a Lumiere world"""
+		world = bpy.data.worlds.get('Lumiere_world')
+		if world is None or world.node_tree is None:
+			self.clear()
+			return None
+
+		# Resolved by name only when a node was added, removed or moved
+		if not self.valid(world.node_tree):
+			self.resolve(world.node_tree)
+		return self
+
+sky_nodes = SkyNodes()
+
+@persistent
+def lumiere_load_post(dummy):
+	"""Drop every cached data from the previous file"""
+	scene_bvhs.clear()
+	lumiere_indices.clear()
+	sky_nodes.clear()
+
+# -------------------------------------------------------------------- #
+## Register
+
+def register():
+	bpy.app.handlers.depsgraph_update_post.append(lumiere_depsgraph_update)
+	bpy.app.handlers.load_post.append(lumiere_load_post)
+	bpy.app.handlers.undo_post.append(lumiere_load_post)
+	bpy.app.handlers.redo_post.append(lumiere_load_post)
+
+def unregister():
+	bpy.app.handlers.depsgraph_update_post.remove(lumiere_depsgraph_update)
+	bpy.app.handlers.load_post.remove(lumiere_load_post)
+	bpy.app.handlers.undo_post.remove(lumiere_load_post)
+	bpy.app.handlers.redo_post.remove(lumiere_load_post)
+	scene_bvhs.clear()
+	lumiere_indices.clear()
+	sky_nodes.clear()
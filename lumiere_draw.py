@@ -1,12 +1,19 @@
 import bpy
 import blf
+import bgl
+import gpu
+import numpy as np
 
+from gpu_extras.batch import batch_for_shader
 from mathutils import Vector
 from .lumiere_utils import (
 	draw_circle,
 	create_2d_circle,
 	draw_shader,
 	)
+from .lumiere_sun import (
+	getSunPositions,
+	)
 from bpy_extras import view3d_utils
 from bpy_extras.view3d_utils import (
 	region_2d_to_vector_3d,
@@ -60,6 +67,9 @@ def draw_callback_3d(self, context):
 	region = context.region
 	rv3d = context.region_data
 
+	# The last light update is on screen, the next one can be solved
+	self.redrawn = True
+
 	if self.light_selected and (context.active_object is not None):
 		light = context.active_object
 		color = context.preferences.themes[0].view_3d.object_active
@@ -80,3 +90,112 @@ def draw_target_px(self, context, event):
 
 		verts, indices = create_2d_circle(20, 20, rotation=0, center_x=x, center_y=y)
 		draw_shader(self, color, 1.0, 'LINE_LOOP', verts[1:], size=2)
+
+# -------------------------------------------------------------------- #
+## Sun path overlay
+# The daily arc and the analemma of the sun around the hit of the linked
+# light. The batch is kept between redraws and only built again when the
+# place, the date or the center change.
+
+SUN_ARC_SAMPLES = 145
+SUN_ARC_COLOR = (1.0, 0.75, 0.2, 1.0)
+SUN_ANALEMMA_COLOR = (1.0, 0.75, 0.2, 0.4)
+
+def sun_path_lines(latitude, longitude, year, month, day, hour, center, radius):
+	"""Vertices, colors and line indices of the daily arc and the analemma.
+	Both curves are solved in one call, only the parts above the horizon
+	are drawn"""
+
+	days = np.arange(1, 366, dtype=np.float64)
+	arc_hours = np.linspace(0.0, 24.0, SUN_ARC_SAMPLES)
+	count = len(arc_hours)
+
+	# The analemma is the sun at the same hour on each day of the year,
+	# the day can overflow January like in the julian day
+	locations, rotations = getSunPositions(
+		localTime = np.concatenate((arc_hours, np.full(len(days), hour))),
+		latitude = latitude,
+		longitude = longitude,
+		northOffset = 0.00,
+		utcZone = 0,
+		month = np.concatenate((np.full(count, month), np.ones(len(days)))),
+		day = np.concatenate((np.full(count, day), days)),
+		year = year,
+		distance = radius)
+
+	verts = (locations + np.asarray(center, dtype=np.float64)).astype(np.float32)
+	colors = np.empty((len(verts), 4), dtype=np.float32)
+	colors[:count] = SUN_ARC_COLOR
+	colors[count:] = SUN_ANALEMMA_COLOR
+
+	# Open arc, closed analemma
+	start = np.concatenate((np.arange(count - 1), np.arange(count, len(verts))))
+	end = np.concatenate((np.arange(1, count), np.arange(count + 1, len(verts)), (count,)))
+	above = locations[:, 2] >= 0.0
+	indices = np.stack((start, end), axis=1)[above[start] & above[end]]
+
+	return verts, colors, indices.astype(np.int32)
+
+class SunPathOverlay:
+	"""Persistent batch of the sun path"""
+
+	def __init__(self):
+		self.key = None
+		self.batch = None
+		self.shader = None
+
+	def clear(self):
+		self.key = None
+		self.batch = None
+
+	def get_batch(self, scene):
+		lumiere = scene.Lumiere
+		light = lumiere.link_to_light
+		if light is not None:
+			center = tuple(light.Lumiere.hit)
+			radius = light.Lumiere.range
+		else:
+			center = (0.0, 0.0, 0.0)
+			radius = 5.0
+
+		key = (lumiere.env_latitude, lumiere.env_longitude, lumiere.env_year, lumiere.env_month, lumiere.env_day, lumiere.env_hour, center, radius)
+		if key != self.key:
+			if self.shader is None:
+				self.shader = gpu.shader.from_builtin('3D_SMOOTH_COLOR')
+			verts, colors, indices = sun_path_lines(*key)
+			self.batch = batch_for_shader(self.shader, 'LINES', {"pos": verts, "color": colors}, indices=indices)
+			self.key = key
+		return self.batch
+
+sun_path_overlay = SunPathOverlay()
+
+def draw_sun_path():
+	scene = bpy.context.scene
+	if not scene.Lumiere.show_sun_path or scene.Lumiere.env_type != "Sky":
+		return
+
+	batch = sun_path_overlay.get_batch(scene)
+	bgl.glEnable(bgl.GL_BLEND)
+	bgl.glEnable(bgl.GL_LINE_SMOOTH)
+	bgl.glLineWidth(2)
+	sun_path_overlay.shader.bind()
+	batch.draw(sun_path_overlay.shader)
+	bgl.glLineWidth(1)
+	bgl.glDisable(bgl.GL_LINE_SMOOTH)
+	bgl.glDisable(bgl.GL_BLEND)
+
+# -------------------------------------------------------------------- #
+## Register
+
+_sun_path_handle = None
+
+def register():
+	global _sun_path_handle
+	_sun_path_handle = bpy.types.SpaceView3D.draw_handler_add(draw_sun_path, (), "WINDOW", "POST_VIEW")
+
+def unregister():
+	global _sun_path_handle
+	if _sun_path_handle is not None:
+		bpy.types.SpaceView3D.draw_handler_remove(_sun_path_handle, "WINDOW")
+		_sun_path_handle = None
+	sun_path_overlay.clear()
@@ -15,6 +15,10 @@ from bpy.types import (
 	)
 from math import sqrt
 
+from .lumiere_cache import (
+	is_lumiere,
+	)
+
 
 
 
@@ -29,13 +33,7 @@ class LUMIERE_GGT_3dgizmo(GizmoGroup):
 
 	@classmethod
 	def poll(cls, context):
-		light = context.object
-		if (context.active_object is not None):
-			if ("Lumiere" in str(context.active_object.users_collection)) \
-			and len(list(context.scene.collection.children['Lumiere'].objects)) > 0 :
-				return context.view_layer.objects.active.name in context.scene.collection.children['Lumiere'].all_objects
-		else:
-			return False
+		return is_lumiere(context.scene, context.active_object)
 
 	def setup(self, context):
 		light = context.object
@@ -9,37 +9,72 @@ from mathutils import (
 
 from .lumiere_materials import (
 	softbox_mat,
-	lamp_mat,
+	lamp_data,
 	)
+from .lumiere_cache import (
+	invalidate_lumiere_indices,
+	)
+
+# Template mesh, each new softbox gets its own copy
+SOFTBOX_MESH = ".Lumiere softbox"
 
 # -------------------------------------------------------------------- #
 # Softbox
 def create_softbox(softbox_name = "Lumiere"):
 	"""Create the panel light with modifiers"""
 
+	light = new_softbox(softbox_name)
+
+	# Add the light to the collection
 	lumiere_collection = bpy.context.scene.collection.children['Lumiere']
-	# Set Lumiere as the active layer collection
-	bpy.context.view_layer.active_layer_collection = bpy.context.view_layer.layer_collection.children['Lumiere']
-	# Add a primitive plane in the active collection
-	bpy.ops.mesh.primitive_plane_add(size=1.0, calc_uvs=False, align='VIEW', enter_editmode=False, \
-									location=(0.0, 0.0, 0.0), rotation=(0.0, 0.0, 90.0))
-	bpy.ops.object.editmode_toggle()
-	bpy.ops.uv.smart_project(angle_limit=66, island_margin=0, user_area_weight=0)
-	bpy.ops.uv.reset()
-	bpy.ops.object.editmode_toggle()
-	light = bpy.context.view_layer.objects.active
-	light.name = softbox_name
-	lumiere_collection = bpy.context.scene.collection.children['Lumiere']
+	lumiere_collection.objects.link(light)
+	invalidate_lumiere_indices()
 
 	# Select the light and make it active
-	bpy.ops.object.select_all(action='DESELECT')
+	for obj in bpy.context.view_layer.objects.selected:
+		obj.select_set(state=False)
 	light.select_set(state=True)
-	light_selected = True
-	bpy.context.view_layer.objects.active = bpy.data.objects[light.name]
+	bpy.context.view_layer.objects.active = light
+
+	return(light)
+
+# -------------------------------------------------------------------- #
+def softbox_template():
+	"""Unit plane copied by the softboxes, built again if it was removed or edited"""
+
+	mesh = bpy.data.meshes.get(SOFTBOX_MESH)
+	if mesh is None or len(mesh.vertices) != 4 or len(mesh.uv_layers) != 1 or len(mesh.materials) != 1:
+		# Assigned by hand to an object, it keeps its geometry
+		if mesh is not None and mesh.users > 0:
+			mesh.name = SOFTBOX_MESH + ".old"
+		elif mesh is not None:
+			bpy.data.meshes.remove(mesh)
+		mesh = softbox_mesh(SOFTBOX_MESH)
+	return(mesh)
+
+def softbox_mesh(name = "Lumiere"):
+	"""Unit plane with one UV square, same as primitive_plane_add and uv.reset"""
+
+	mesh = bpy.data.meshes.new(name)
+	mesh.from_pydata(((-0.5, -0.5, 0.0), (0.5, -0.5, 0.0), (-0.5, 0.5, 0.0), (0.5, 0.5, 0.0)), (), ((0, 1, 3, 2),))
+	uv_layer = mesh.uv_layers.new(name = "UVMap")
+	uv_layer.data.foreach_set("uv", (0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
+	# Empty slot, the material of each softbox is linked to its object
+	mesh.materials.append(None)
+	mesh.update()
+
+	return(mesh)
+
+def new_softbox(softbox_name = "Lumiere"):
+	"""Softbox built with the data API only, not linked to a collection"""
+
+	# Own copy of the template, editing a softbox never changes the others
+	mesh = softbox_template().copy()
+	mesh.name = softbox_name
+	light = bpy.data.objects.new(softbox_name, mesh)
 
 	# Add the material
 	softbox_mat(light)
-	mat = light.active_material
 
 	# Change the visibility
 	light.display_type = 'WIRE'
@@ -49,41 +84,45 @@ def create_softbox(softbox_name = "Lumiere"):
 	light.cycles_visibility.shadow = False
 
 	# Add Bevel
-	light.modifiers.new("Bevel", type='BEVEL')
-	light.modifiers["Bevel"].use_only_vertices = True
-	light.modifiers["Bevel"].use_clamp_overlap = True
-	light.modifiers["Bevel"].loop_slide = True
-	light.modifiers["Bevel"].width = .25
-	light.modifiers["Bevel"].segments = 5
-	light.modifiers["Bevel"].profile = .5
-	light.modifiers["Bevel"].show_expanded = False
+	bevel = light.modifiers.new("Bevel", type='BEVEL')
+	bevel.use_only_vertices = True
+	bevel.use_clamp_overlap = True
+	bevel.loop_slide = True
+	bevel.width = .25
+	bevel.segments = 5
+	bevel.profile = .5
+	bevel.show_expanded = False
 
 	return(light)
 
 # -------------------------------------------------------------------- #
 # Blender Light
+def new_lamp(type, name = "Lumiere"):
+	"""Blender light with its nodes, not linked to a collection"""
+	# Copy of the template, with its nodes and MIS
+	light_data = lamp_data(type, name)
+	light = bpy.data.objects.new(name = name, object_data = light_data)
+
+	# Initialize Type
+	light.Lumiere.light_type = type
+
+	return(light)
+
 """Create a blender light"""
 def create_lamp(type, name = "Lumiere"):
 	# Create the lamp
-	light_data = bpy.data.lights.new(name = name, type = type.upper())
-	light = bpy.data.objects.new(name = name, object_data = light_data)
+	light = new_lamp(type, name)
 
 	# Add the light to the collection
 	lumiere_collection = bpy.context.scene.collection.children['Lumiere']
 	lumiere_collection.objects.link(light)
+	invalidate_lumiere_indices()
 
-	# Initialize MIS / Type / Name
-	light.data.cycles.use_multiple_importance_sampling = True
-
-	# Select and active the light
-	bpy.ops.object.select_all(action='DESELECT')
+	# Select the light and make it active
+	for obj in bpy.context.view_layer.objects.selected:
+		obj.select_set(state=False)
 	light.select_set(state=True)
-	light_selected = True
 	bpy.context.view_layer.objects.active = light
-	light.Lumiere.light_type = type
-
-	# Create nodes
-	lamp_mat(light)
 
 	return(light)
 
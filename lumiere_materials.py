@@ -14,6 +14,47 @@ from mathutils import (
 	Quaternion,
 	Euler,
 	)
+from .lumiere_cache import (
+	sky_nodes,
+	)
+from . import bl_info
+
+# Templates
+#########################################################################################################
+# The node trees are built once in hidden datablocks, the new lights and
+# the world are copies of them. A template is built again when the version
+# of the add-on changes.
+SOFTBOX_TEMPLATE = ".Lumiere softbox"
+LAMP_TEMPLATE = ".Lumiere lamp"
+WORLD_TEMPLATE = ".Lumiere world"
+
+TEMPLATE_VERSION = "lumiere_version"
+ADDON_VERSION = ".".join(str(number) for number in bl_info["version"])
+
+def get_template(datablocks, name, build, *args):
+	"""Hidden datablock with the nodes made by build, kept in the blend file"""
+
+	template = datablocks.get(name)
+	if template is not None and template.get(TEMPLATE_VERSION) != ADDON_VERSION:
+		datablocks.remove(template)
+		template = None
+
+	if template is None:
+		template = datablocks.new(name, *args)
+		template.use_fake_user = True
+		build(template)
+		template[TEMPLATE_VERSION] = ADDON_VERSION
+
+	return(template)
+
+def copy_template(datablocks, name, build, *args):
+	"""New datablock copied from a template"""
+
+	copy = get_template(datablocks, name, build, *args).copy()
+	copy.use_fake_user = False
+	del copy[TEMPLATE_VERSION]
+
+	return(copy)
 
 # Softbox
 #########################################################################################################
@@ -24,15 +65,30 @@ def softbox_mat(light):
 	if bpy.context.scene.render.engine != 'CYCLES':
 		bpy.context.scene.render.engine = 'CYCLES'
 
-	if light.active_material is None:
-		mat = bpy.data.materials.new(light.name)
-
-		# Use nodes by default
-		mat.use_nodes = True
+	mat = copy_template(bpy.data.materials, SOFTBOX_TEMPLATE, softbox_nodes)
+	mat.name = light.name
 
-	# Assign the material to the light
+	# Assign the material to the object, the mesh is shared between the softboxes
+	if light.material_slots:
+		light.material_slots[0].link = 'OBJECT'
 	light.active_material = mat
 
+	# Values of the light
+	nodes = mat.node_tree.nodes
+	nodes["IES Texture"].inputs[1].default_value = light.Lumiere.energy
+	nodes["Emit texture"].inputs[0].default_value = light.Lumiere.light_color
+	nodes["Emit color"].inputs[0].default_value = light.Lumiere.light_color
+	nodes["Diffuse BSDF"].inputs[0].default_value = light.Lumiere.light_color
+
+	return(mat)
+
+# -------------------------------------------------------------------- #
+def softbox_nodes(mat):
+	"""Nodes of the softbox template material"""
+
+	# Use nodes by default
+	mat.use_nodes = True
+
 	# Clear node tree
 	mat.node_tree.nodes.clear()
 
@@ -232,7 +288,6 @@ def softbox_mat(light):
 	ies.name = "IES Texture"
 	mat.node_tree.links.new(ies_map.outputs[0], ies.inputs[0])
 	ies.mode = 'INTERNAL'
-	ies.inputs[1].default_value = light.Lumiere.energy
 	ies.location = (-1740, -200)
 
 	# Math MULTIPLY
@@ -254,7 +309,6 @@ def softbox_mat(light):
 	# Texture Emission Node
 	texture_emit = mat.node_tree.nodes.new(type = 'ShaderNodeEmission')
 	texture_emit.name = "Emit texture"
-	texture_emit.inputs[0].default_value = bpy.context.active_object.Lumiere.light_color
 	mat.node_tree.links.new(refl_mix_color_text.outputs[0], texture_emit.inputs[0])
 	mat.node_tree.links.new(falloff.outputs[0], texture_emit.inputs[1])
 	texture_emit.location = (-220, 20)
@@ -262,7 +316,6 @@ def softbox_mat(light):
 	# Color Emission Node
 	color_emit = mat.node_tree.nodes.new(type = 'ShaderNodeEmission')
 	color_emit.name = "Emit color"
-	color_emit.inputs[0].default_value = bpy.context.active_object.Lumiere.light_color
 	mat.node_tree.links.new(mix_color_text.outputs[0], color_emit.inputs[0])
 	color_emit.location = (-220, -160)
 
@@ -304,7 +357,6 @@ def softbox_mat(light):
 
 	# Diffuse Node
 	diffuse = mat.node_tree.nodes.new(type = 'ShaderNodeBsdfDiffuse')
-	diffuse.inputs[0].default_value = bpy.context.active_object.Lumiere.light_color
 	mat.node_tree.links.new(color.outputs[0], diffuse.inputs[0])
 	diffuse.location = (500, -220)
 
@@ -357,10 +409,15 @@ def update_mat(self, context):
 	if context.scene.Lumiere.link_to_light:
 		light = context.scene.Lumiere.link_to_light
 
+	update_light_mat(light)
+
+def update_light_mat(light):
+	"""Update the material nodes of a light, without using the context"""
+
 	# Softbox Light
 	if light.type == "MESH":
 
-		mat = get_mat_name()
+		mat = light.active_material
 		reflect_light_path = mat.node_tree.nodes["Reflect Light Path"]
 		invert = mat.node_tree.nodes["Texture invert"]
 		mix_col_text = mat.node_tree.nodes["Mix_Color_Text"]
@@ -493,25 +550,36 @@ def update_mat(self, context):
 		update_lamp(light)
 
 # -------------------------------------------------------------------- #
-def lamp_mat(light):
-	"""Cycles material nodes for blender lights"""
+def lamp_data(type, name = "Lumiere"):
+	"""Blender light data with its nodes, copied from the template"""
 
 	# Create a new material for cycles Engine.
 	bpy.context.scene.render.engine = 'CYCLES'
-	mat = bpy.data.materials.new(light.name)
+
+	data = copy_template(bpy.data.lights, LAMP_TEMPLATE, lamp_nodes, 'POINT')
+	data.name = name
+	data.type = type.upper()
+
+	return(data)
+
+# -------------------------------------------------------------------- #
+def lamp_nodes(lamp):
+	"""Nodes of the template light"""
+
+	lamp.cycles.use_multiple_importance_sampling = True
 
 	# Clear default nodes
-	light.data.use_nodes = True
-	light.data.node_tree.nodes.clear()
+	lamp.use_nodes = True
+	lamp.node_tree.nodes.clear()
 
 	# Texture Coordinate
-	coord = light.data.node_tree.nodes.new(type = 'ShaderNodeTexCoord')
+	coord = lamp.node_tree.nodes.new(type = 'ShaderNodeTexCoord')
 	coord.location = (-1300.0, 280.0)
 
 #### TEXTURE ###
 	# Mapping Texture Node
-	textmap = light.data.node_tree.nodes.new(type="ShaderNodeMapping")
-	light.data.node_tree.links.new(coord.outputs[1], textmap.inputs[0])
+	textmap = lamp.node_tree.nodes.new(type="ShaderNodeMapping")
+	lamp.node_tree.links.new(coord.outputs[1], textmap.inputs[0])
 	textmap.vector_type = "POINT"
 	textmap.name = "Texture Mapping"
 	textmap.inputs[1].default_value[0] = 0.5
@@ -519,94 +587,94 @@ def lamp_mat(light):
 	textmap.location = (-1100.0, 860.0)
 
 	# Image Texture
-	texture = light.data.node_tree.nodes.new(type = 'ShaderNodeTexImage')
-	light.data.node_tree.links.new(textmap.outputs[0], texture.inputs[0])
+	texture = lamp.node_tree.nodes.new(type = 'ShaderNodeTexImage')
+	lamp.node_tree.links.new(textmap.outputs[0], texture.inputs[0])
 	texture.projection_blend = 0
 	texture.projection = 'FLAT'
 	texture.extension = 'CLIP'
 	texture.location = (-920.0, 800.0)
 
 	# Invert Node
-	invert = light.data.node_tree.nodes.new(type="ShaderNodeInvert")
+	invert = lamp.node_tree.nodes.new(type="ShaderNodeInvert")
 	invert.name = "Texture invert"
-	light.data.node_tree.links.new(texture.outputs[0], invert.inputs[1])
+	lamp.node_tree.links.new(texture.outputs[0], invert.inputs[1])
 	invert.location = (-640.0, 740.0)
 
 #### IES ###
 	# Mapping
-	ies_map = light.data.node_tree.nodes.new(type="ShaderNodeMapping")
-	light.data.node_tree.links.new(coord.outputs[1], ies_map.inputs[0])
+	ies_map = lamp.node_tree.nodes.new(type="ShaderNodeMapping")
+	lamp.node_tree.links.new(coord.outputs[1], ies_map.inputs[0])
 	ies_map.vector_type = "TEXTURE"
 	ies_map.name = "IES map"
 	ies_map.location = (-1100.0, 480.0)
 
 	# IES
-	ies = light.data.node_tree.nodes.new(type="ShaderNodeTexIES")
+	ies = lamp.node_tree.nodes.new(type="ShaderNodeTexIES")
 	ies.name = "IES"
 	ies.mode = 'INTERNAL'
-	light.data.node_tree.links.new(ies_map.outputs[0], ies.inputs[0])
+	lamp.node_tree.links.new(ies_map.outputs[0], ies.inputs[0])
 	ies.location = (-920.0, 360.0)
 
 	# IES Math MULTIPLY
-	ies_math = light.data.node_tree.nodes.new(type = 'ShaderNodeMath')
+	ies_math = lamp.node_tree.nodes.new(type = 'ShaderNodeMath')
 	ies_math.name = "IES Math"
-	light.data.node_tree.links.new(ies.outputs[0], ies_math.inputs[0])
+	lamp.node_tree.links.new(ies.outputs[0], ies_math.inputs[0])
 	ies_math.inputs[1].default_value = 0.01
 	ies_math.operation = 'MULTIPLY'
 	ies_math.location = (-740, 360)
 
 #### GRADIENT AREA LIGHT###
 	# Geometry Node
-	geom = light.data.node_tree.nodes.new(type="ShaderNodeNewGeometry")
+	geom = lamp.node_tree.nodes.new(type="ShaderNodeNewGeometry")
 	geom.location = (-1300, -220)
 
 	# Dot Product
-	dotpro = light.data.node_tree.nodes.new("ShaderNodeVectorMath")
+	dotpro = lamp.node_tree.nodes.new("ShaderNodeVectorMath")
 	dotpro.operation = 'DOT_PRODUCT'
-	light.data.node_tree.links.new(geom.outputs[1], dotpro.inputs[0])
-	light.data.node_tree.links.new(geom.outputs[4], dotpro.inputs[1])
+	lamp.node_tree.links.new(geom.outputs[1], dotpro.inputs[0])
+	lamp.node_tree.links.new(geom.outputs[4], dotpro.inputs[1])
 	dotpro.name = "Dot Product"
 	dotpro.location = (-920.0, -180.0)
 
 #### GRADIENT POINT / SPOT LIGHT ###
 	# Mapping Gradient Node
-	gradmap = light.data.node_tree.nodes.new(type="ShaderNodeMapping")
-	light.data.node_tree.links.new(coord.outputs[1], gradmap.inputs[0])
+	gradmap = lamp.node_tree.nodes.new(type="ShaderNodeMapping")
+	lamp.node_tree.links.new(coord.outputs[1], gradmap.inputs[0])
 	gradmap.vector_type = "TEXTURE"
 	gradmap.name = "Gradient Mapping"
 	gradmap.inputs[2].default_value[1] = radians(90)
 	gradmap.location = (-1100.0, 100.0)
 
 	# Gradient Node Quadratic
-	quad_grad = light.data.node_tree.nodes.new(type="ShaderNodeTexGradient")
-	light.data.node_tree.links.new(gradmap.outputs[0], quad_grad.inputs[0])
+	quad_grad = lamp.node_tree.nodes.new(type="ShaderNodeTexGradient")
+	lamp.node_tree.links.new(gradmap.outputs[0], quad_grad.inputs[0])
 	quad_grad.location = (-920, 20)
 
 #### ALL LIGHTS ###
 
 	# Color Ramp
-	colramp = light.data.node_tree.nodes.new(type="ShaderNodeValToRGB")
+	colramp = lamp.node_tree.nodes.new(type="ShaderNodeValToRGB")
 	colramp.color_ramp.elements[0].color = (1,1,1,1)
-	light.data.node_tree.links.new(dotpro.outputs[1], colramp.inputs[0])
+	lamp.node_tree.links.new(dotpro.outputs[1], colramp.inputs[0])
 	colramp.location = (-740.0, 100.0)
 
 	# Light Falloff
-	falloff = light.data.node_tree.nodes.new(type = 'ShaderNodeLightFalloff')
-	light.data.node_tree.links.new(ies_math.outputs[0], falloff.inputs[0])
+	falloff = lamp.node_tree.nodes.new(type = 'ShaderNodeLightFalloff')
+	lamp.node_tree.links.new(ies_math.outputs[0], falloff.inputs[0])
 	falloff.inputs[0].default_value = 10
 	falloff.location = (-100.0, 120.0)
 
 	# RGB Node
-	color = light.data.node_tree.nodes.new(type = 'ShaderNodeRGB')
+	color = lamp.node_tree.nodes.new(type = 'ShaderNodeRGB')
 	color.location = (-100.0, 760.0)
 
 	# Blackbody : Horizon daylight kelvin temperature for sun
-	blackbody = light.data.node_tree.nodes.new("ShaderNodeBlackbody")
+	blackbody = lamp.node_tree.nodes.new("ShaderNodeBlackbody")
 	blackbody.inputs[0].default_value = 4000
 	blackbody.location = (-100.0, 560.0)
 
 	# Mix Color Texture
-	mix_color_text = light.data.node_tree.nodes.new(type = 'ShaderNodeMixRGB')
+	mix_color_text = lamp.node_tree.nodes.new(type = 'ShaderNodeMixRGB')
 	mix_color_text.name = "Mix_Color_Text"
 	mix_color_text.blend_type = 'MULTIPLY'
 	mix_color_text.inputs[0].default_value = 1
@@ -617,22 +685,22 @@ def lamp_mat(light):
 #### FALLOFF from Metin Seven ###
 
 	# Ligth Path
-	falloff_path = light.data.node_tree.nodes.new(type = 'ShaderNodeLightPath')
+	falloff_path = lamp.node_tree.nodes.new(type = 'ShaderNodeLightPath')
 	falloff_path.name = "Fallof light path"
 	falloff_path.location = (-460, -160)
 
 	# Math DIVIDE
-	falloff_divide = light.data.node_tree.nodes.new(type = 'ShaderNodeMath')
+	falloff_divide = lamp.node_tree.nodes.new(type = 'ShaderNodeMath')
 	falloff_divide.name = "Falloff divide"
 	falloff_divide.inputs[1].default_value = 20
 	falloff_divide.operation = 'DIVIDE'
-	light.data.node_tree.links.new(falloff_path.outputs[7], falloff_divide.inputs[0])
+	lamp.node_tree.links.new(falloff_path.outputs[7], falloff_divide.inputs[0])
 	falloff_divide.location = (-280, -160)
 
 	# Color Ramp Node
-	falloff_colramp = light.data.node_tree.nodes.new(type="ShaderNodeValToRGB")
+	falloff_colramp = lamp.node_tree.nodes.new(type="ShaderNodeValToRGB")
 	falloff_colramp.name = "Falloff colRamp"
-	light.data.node_tree.links.new(falloff_divide.outputs[0], falloff_colramp.inputs['Fac'])
+	lamp.node_tree.links.new(falloff_divide.outputs[0], falloff_colramp.inputs['Fac'])
 	falloff_colramp.color_ramp.interpolation = 'LINEAR'
 	falloff_colramp.color_ramp.elements[0].color = (1,1,1,1)
 	falloff_colramp.inputs[0].default_value = 0
@@ -640,28 +708,28 @@ def lamp_mat(light):
 	falloff_colramp.location = (-100, -100)
 
 	# Math MULTIPLY
-	falloff_multiply = light.data.node_tree.nodes.new(type = 'ShaderNodeMath')
+	falloff_multiply = lamp.node_tree.nodes.new(type = 'ShaderNodeMath')
 	falloff_multiply.name = "Falloff multiply"
 	falloff_multiply.operation = 'MULTIPLY'
-	light.data.node_tree.links.new(falloff.outputs[0], falloff_multiply.inputs[1])
-	light.data.node_tree.links.new(falloff_colramp.outputs[0], falloff_multiply.inputs[0])
+	lamp.node_tree.links.new(falloff.outputs[0], falloff_multiply.inputs[1])
+	lamp.node_tree.links.new(falloff_colramp.outputs[0], falloff_multiply.inputs[0])
 	falloff_multiply.location = (200, 140)
 
 #### OUTPUT ###
 
 	# Emission Node
-	emit = light.data.node_tree.nodes.new(type = 'ShaderNodeEmission')
+	emit = lamp.node_tree.nodes.new(type = 'ShaderNodeEmission')
 	## EEVEE doesn't work with nodes, use data color instead.
 	emit.inputs[0].default_value = (1,1,1,1)
-	light.data.node_tree.links.new(falloff_multiply.outputs[0], emit.inputs[1])
+	lamp.node_tree.links.new(falloff_multiply.outputs[0], emit.inputs[1])
 	emit.location = (360.0, 320.0)
 
 	# Output Shader Node
-	output = light.data.node_tree.nodes.new(type = 'ShaderNodeOutputLight')
+	output = lamp.node_tree.nodes.new(type = 'ShaderNodeOutputLight')
 	output.location = (540.0, 300.0)
 
 	#Link them together
-	light.data.node_tree.links.new(emit.outputs[0], output.inputs['Surface'])
+	lamp.node_tree.links.new(emit.outputs[0], output.inputs['Surface'])
 
 # -------------------------------------------------------------------- #
 def update_lamp(light):
@@ -770,23 +838,25 @@ def update_lamp(light):
 def create_world(self, context):
 	"""Cycles material nodes for the woorld environment light"""
 
-	# Create a new world if not exist
-	world = ""
-
-	for w in bpy.data.worlds:
-		if w.name == "Lumiere_world":
-			world = bpy.data.worlds['Lumiere_world']
-			context.scene.world = world
+	# A new world replaces the previous one, with fresh nodes
+	world = copy_template(bpy.data.worlds, WORLD_TEMPLATE, world_nodes)
+	old_world = bpy.data.worlds.get("Lumiere_world")
+	if old_world is not None:
+		old_world.user_remap(world)
+		bpy.data.worlds.remove(old_world)
+	world.name = "Lumiere_world"
+	context.scene.world = world
+	sky_nodes.clear()
 
-	if world == "":
-		context.scene.world = bpy.data.worlds.new("Lumiere_world")
-		world = context.scene.world
+# -------------------------------------------------------------------- #
+def world_nodes(world):
+	"""Nodes of the template world"""
 
 	world.use_nodes= True
 	world.node_tree.nodes.clear()
 
 	# Use multiple importance sampling for the world
-	context.scene.world.cycles.sample_as_light = True
+	world.cycles.sample_as_light = True
 
 	# Texture Coordinate
 	coord = world.node_tree.nodes.new(type = 'ShaderNodeTexCoord')
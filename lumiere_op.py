@@ -2,16 +2,42 @@ import bpy
 import os
 import json
 import sys
+import time
+import numpy as np
 from bpy_extras import view3d_utils
+from bpy.app.handlers import persistent
 from .lumiere_utils import (
 	get_mat_name,
 	raycast_light,
+	batch_place_lights,
 	export_props_light,
 	export_props_group,
-	get_lumiere_dict,
-	update_lumiere_dict,
 	cartesian_coordinates,
-	setSunPosition,
+	bake_sun_states,
+	clear_baked_fcurves,
+	clear_sun_study_markers,
+	SUN_STUDY_MARKER,
+	)
+
+from .lumiere_sun import (
+	getSunPositions,
+	)
+
+from .lumiere_ui import (
+	anim_hour,
+	update_env_hour,
+	)
+
+from .lumiere_presets import (
+	preset_store,
+	GROUP_PREFIX,
+	GROUP_TYPE,
+	)
+
+from .lumiere_cache import (
+	get_scene_bvh,
+	is_lumiere,
+	invalidate_lumiere_indices,
 	)
 
 from .lumiere_draw import (
@@ -20,16 +46,15 @@ from .lumiere_draw import (
 	draw_target_px,
 	)
 
-from .lumiere_lights import (
-	create_softbox,
-	)
-
 from .lumiere_materials import (
-	update_mat,
+	update_light_mat,
 	)
+
 from .lumiere_lights import (
 	create_softbox,
 	create_lamp,
+	new_softbox,
+	new_lamp,
 	)
 
 from bpy.types import Operator
@@ -107,34 +132,29 @@ class LUMIERE_OT_PresetPopup(Operator):
 		else:
 			row.label(text="Export list is empty")
 
-		if (context.active_object is not None):
-			if ("Lumiere" in str(context.active_object.users_collection)) \
-			and len(list(context.scene.collection.children['Lumiere'].objects)) > 0 and context.view_layer.objects.active.name in context.scene.collection.children['Lumiere'].all_objects :
+		if is_lumiere(context.scene, context.active_object):
 
-				row = col.row()
-				if len(context.view_layer.objects.selected) > 1:
-					row.prop(self, "group", text="Group", expand=False)
-					op = row.operator("object.export_light", text ="", emboss=False, icon="ADD")
-					op.name = self.group
-				else:
-					row.prop(light, "name", text="Light", expand=False)
-					op = row.operator("object.export_light", text ="", emboss=False, icon="ADD")
-					op.name = light.name
+			row = col.row()
+			if len(context.view_layer.objects.selected) > 1:
+				row.prop(self, "group", text="Group", expand=False)
+				op = row.operator("object.export_light", text ="", emboss=False, icon="ADD")
+				op.name = self.group
+			else:
+				row.prop(light, "name", text="Light", expand=False)
+				op = row.operator("object.export_light", text ="", emboss=False, icon="ADD")
+				op.name = light.name
 
 
 	def invoke(self, context, event):
 		context.scene.Lumiere_lights_list.clear()
-		my_dict = get_lumiere_dict()
 
-		for key, value in my_dict.items():
+		# Only the index is read, the presets are loaded on import
+		for key, name, count, light_type in preset_store.items():
 		#---Fill the items for the light
 			item = context.scene.Lumiere_lights_list.add()
-			if key.startswith("Group_"):
-				item.name = key[6:]
-				item.num = str(len(value))
-			else:
-				item.name = key
-				item.num = "1"
+			item.name = name
+			item.num = str(count)
+			item.light_type = light_type
 
 		return context.window_manager.invoke_popup(self)
 
@@ -148,23 +168,11 @@ class LUMIERE_OT_export_light(Operator):
 	name : bpy.props.StringProperty()
 
 	def execute(self, context):
-		current_file_path = __file__
-		current_file_dir = os.path.dirname(__file__)
 		light = context.active_object
 		light_selected = []
 
-	#---Try to open the Lumiere export dictionary
-		try:
-			with open(current_file_dir + "\\" + "lumiere_dictionary.json", 'r', encoding='utf-8') as file:
-				my_dict = json.load(file)
-				file.close()
-		except Exception:
-			print("Warning, dict empty, creating a new one.")
-			my_dict = {}
-
-		# list(context.scene.collection.children['Lumiere'].objects)
 		for obj in context.view_layer.objects.selected:
-			if obj in list(context.scene.collection.children['Lumiere'].objects):
+			if is_lumiere(context.scene, obj):
 				light_selected.append(obj)
 
 		if len(light_selected) > 1:
@@ -172,12 +180,9 @@ class LUMIERE_OT_export_light(Operator):
 		else:
 			lumiere_dict = export_props_light(self, context, light)
 
-		my_dict.update(lumiere_dict)
-
-		with open(current_file_dir + "\\" + "lumiere_dictionary.json", "w", encoding='utf-8') as file:
-			json.dump(my_dict, file, sort_keys=True, indent=4, ensure_ascii=False)
+		# Only the rows of the exported lights are written
+		preset_store.put(lumiere_dict)
 
-		file.close()
 		message = "Light exported"
 		self.report({'INFO'}, message)
 		return {'FINISHED'}
@@ -210,32 +215,64 @@ class PRESET_OT_actions(Operator):
 		list = context.scene.Lumiere_lights_list
 		list_index = context.scene.Lumiere_lights_list_index
 
-		if int(list[list_index].num) > 1:
-			light_from_dict = self.my_dict["Group_" + scn.Lumiere_lights_list[list_index].name]
-			for light in light_from_dict:
-				self.create_light(context, light_from_dict[light], light)
+		if list[list_index].light_type == GROUP_TYPE:
+			presets = preset_store.get(GROUP_PREFIX + scn.Lumiere_lights_list[list_index].name)
 		else:
-			light_from_dict = self.my_dict[scn.Lumiere_lights_list[list_index].name]
-			self.create_light(context, light_from_dict, scn.Lumiere_lights_list[list_index].name)
+			presets = {scn.Lumiere_lights_list[list_index].name: preset_store.get(scn.Lumiere_lights_list[list_index].name)}
 
+		self.create_lights(context, presets)
 
-	def create_light(self, context, light_from_dict, light_name):
-		scn = context.scene
-		list_index = context.scene.Lumiere_lights_list_index
+	def create_lights(self, context, presets):
+		"""Build all the lights of a preset with the data API, link them
+		together, then update their materials once"""
+
+		# Removed from the database by another Blender since the list was read
+		if presets is None or None in presets.values():
+			self.report({'WARNING'}, "Preset not found")
+			return
+
+		if 'Lumiere' not in context.scene.collection.children.keys() :
+			_lumiere_coll = bpy.data.collections.new("Lumiere")
+			context.scene.collection.children.link(_lumiere_coll)
+		lumiere_collection = context.scene.collection.children['Lumiere']
+
+		lights = []
+		for light_name, light_from_dict in presets.items():
+			if light_from_dict["Lumiere"]["light_type"] == "Softbox":
+				light = new_softbox(light_name)
+			else:
+				light = new_lamp(light_from_dict["Lumiere"]["light_type"], light_name)
+				if light.data.type == "AREA" :
+					light.data.shape = light_from_dict['shape']
+			lights.append((light, light_from_dict))
+
+		for light, light_from_dict in lights:
+			lumiere_collection.objects.link(light)
+		invalidate_lumiere_indices()
+
+		for obj in context.view_layer.objects.selected:
+			obj.select_set(state=False)
 
-		if light_from_dict["Lumiere"]["light_type"] == "Softbox":
-			light = create_softbox(light_name)
+		for light, light_from_dict in lights:
+			light.select_set(state=True)
+			# The update functions of the properties use the active object
+			context.view_layer.objects.active = light
+			self.create_light(context, light, light_from_dict)
+
+		for light, light_from_dict in lights:
+			update_light_mat(light)
+
+	def create_light(self, context, light, light_from_dict):
+		"""Restore the properties and ramps of a light from its preset"""
+
+		if light.type == "MESH":
 			mat = get_mat_name(light)
 			colramp = mat.node_tree.nodes['ColorRamp'].color_ramp
 			falloff_ramp = mat.node_tree.nodes['Falloff colRamp'].color_ramp
 		else:
-			light = create_lamp(light_from_dict["Lumiere"]["light_type"], light_name)
 			colramp = light.data.node_tree.nodes["ColorRamp"].color_ramp
 			falloff_ramp = light.data.node_tree.nodes['Falloff colRamp'].color_ramp
 
-			if light.data.type == "AREA" :
-				light.data.shape = light_from_dict['shape']
-
 		light["Lumiere"] = light_from_dict["Lumiere"]
 		light.location = light_from_dict["location"]
 		light.rotation_euler = light_from_dict["rotation"]
@@ -263,27 +300,23 @@ class PRESET_OT_actions(Operator):
 			falloff_ramp.elements[i].color[:] = value
 			i += 1
 
-		update_mat(self, context)
-
 	def remove_light(self, context):
 		list = context.scene.Lumiere_lights_list
 		list_index = context.scene.Lumiere_lights_list_index
 
-		if int(list[list_index].num) > 1:
+		if list[list_index].light_type == GROUP_TYPE:
 			self.report({'INFO'}, "Group " + list[list_index].name + " deleted from the list")
-			self.my_dict.pop("Group_"+list[list_index].name, None)
+			preset_store.remove(GROUP_PREFIX + list[list_index].name)
 		else:
 			self.report({'INFO'}, "Light " + list[list_index].name + " deleted from the list")
-			self.my_dict.pop(list[list_index].name, None)
+			preset_store.remove(list[list_index].name)
 
 		list.remove(list_index)
 		list_index -= 1
-		update_lumiere_dict(self.my_dict)
 
 	def invoke(self, context, event):
 		scn = context.scene
 		idx = scn.Lumiere_lights_list_index
-		self.my_dict = get_lumiere_dict()
 
 		try:
 			item = scn.Lumiere_lights_list[idx]
@@ -324,6 +357,13 @@ class LUMIERE_OT_ray_operator(Operator):
 		self.shift = False
 		self.ctrl = False
 		self.lmb = False
+		self.timer = None
+		self.redrawn = True
+		self.pending_coord = None
+		self.last_solve = 0.0
+		# Mouse moves solved, and merged into a later one
+		self.events_processed = 0
+		self.events_dropped = 0
 		self.txt_shift = "SHIFT : Target | "
 		self.txt_ctrl = "CTRL : Energy | "
 		self.txt_alt = "ALT : Rage | "
@@ -341,6 +381,13 @@ class LUMIERE_OT_ray_operator(Operator):
 		self.enable_tool = context.space_data.show_gizmo_tool
 		self.relat_lines = context.space_data.overlay.show_relationship_lines
 
+		# Mouse moves are merged and solved at most once per frame budget
+		self.frame_budget = 1.0 / self.addon_prefs.interactive_rate
+		self.timer = context.window_manager.event_timer_add(self.frame_budget, window=context.window)
+
+		# Build the ray acceleration structure once for the whole session
+		get_scene_bvh(context.scene).build(context)
+
 		self.register_handlers(args, context)
 		context.window_manager.modal_handler_add(self)
 		return {"RUNNING_MODAL"}
@@ -362,6 +409,12 @@ class LUMIERE_OT_ray_operator(Operator):
 		self.draw_handle_3d = None
 		context.scene.is_running = False
 
+		if self.timer is not None:
+			context.window_manager.event_timer_remove(self.timer)
+			self.timer = None
+		if self.events_processed or self.events_dropped:
+			self.report({'INFO'}, "%d mouse moves solved, %d merged" % (self.events_processed, self.events_dropped))
+
 		if context.view_layer.active_layer_collection.name == "Lumiere":
 			context.view_layer.active_layer_collection = context.view_layer.layer_collection
 
@@ -373,7 +426,6 @@ class LUMIERE_OT_ray_operator(Operator):
 		check_light_selected(self, context)
 
 		light = context.active_object
-		rv3d = context.region_data
 
 		# Hide 3d cursor
 		if self.in_view_3d:
@@ -417,34 +469,25 @@ class LUMIERE_OT_ray_operator(Operator):
 			elif event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'} or event.type.startswith("NUMPAD"):
 				return {'PASS_THROUGH'}
 
+			# Solve the last mouse position kept when the frame budget allows it
+			elif event.type == 'TIMER':
+				self.solve_pending(context)
+				return {'PASS_THROUGH'}
+
 			# Left mouse button pressed with an object from Lumiere collection
 			if self.lmb and self.in_view_3d:
-				if self.action == "shadow":
-					coord = (event.mouse_region_x, event.mouse_region_y)
-					self.shadow_hit = Vector(bpy.context.active_object.Lumiere.hit).copy()
-
-					# Get the ray from the viewport and mouse
-					# Direction vector from the viewport to 2d coord
-					view_vector = view3d_utils.region_2d_to_vector_3d(context.region, rv3d, (coord))
-					# 3d view origin vector from the region
-					ray_origin = view3d_utils.region_2d_to_origin_3d(context.region, rv3d, (coord))
-					# Define a default direction vector
-					ray_target = ray_origin + view_vector
-					ray_dir = ray_target - ray_origin
-					result, hit_location, face_normal, face_index, object, matrix = context.scene.ray_cast(context.view_layer, ray_origin, ray_dir)
-					light.Lumiere.shadow = hit_location
-
-					raycast_light(self, event, context, context.object.Lumiere.range, shadow=True, shadow_hit=self.shadow_hit,)
+				if self.action == "shadow" or self.light_selected:
+					# Keep only the latest cursor position
+					if self.pending_coord is not None:
+						self.events_dropped += 1
+					self.pending_coord = (event.mouse_region_x, event.mouse_region_y)
+					self.solve_pending(context)
 				else:
 					context.scene.cycles.preview_pause = self.addon_prefs.render_pause
-					if self.light_selected :
-						# Raycast to move the light compared to the targeted object
-						raycast_light(self, event, context, context.object.Lumiere.range)
+					if self.light_type == "Softbox":
+						create_softbox()
 					else:
-						if self.light_type == "Softbox":
-							create_softbox()
-						else:
-							create_lamp(type = self.light_type)
+						create_lamp(type = self.light_type)
 
 				return {'RUNNING_MODAL'}
 			elif self.ctrl and self.in_view_3d:
@@ -469,6 +512,39 @@ class LUMIERE_OT_ray_operator(Operator):
 
 			return {'FINISHED'}
 
+	def solve_pending(self, context):
+		"""Place the light at the pending cursor position, at most once per redraw"""
+		if self.pending_coord is None or not self.redrawn:
+			return
+		if time.perf_counter() - self.last_solve < self.frame_budget:
+			return
+
+		coord = self.pending_coord
+		self.pending_coord = None
+		self.redrawn = False
+		self.last_solve = time.perf_counter()
+		self.events_processed += 1
+
+		light = context.active_object
+		if self.action == "shadow":
+			self.shadow_hit = Vector(light.Lumiere.hit).copy()
+
+			# Get the ray from the viewport and mouse
+			# Direction vector from the viewport to 2d coord
+			view_vector = view3d_utils.region_2d_to_vector_3d(context.region, context.region_data, (coord))
+			# 3d view origin vector from the region
+			ray_origin = view3d_utils.region_2d_to_origin_3d(context.region, context.region_data, (coord))
+			result, hit_location, face_normal, face_index, object, matrix = context.scene.ray_cast(context.view_layer, ray_origin, view_vector)
+			light.Lumiere.shadow = hit_location
+
+			raycast_light(self, coord, context, light.Lumiere.range, shadow=True, shadow_hit=self.shadow_hit,)
+		else:
+			context.scene.cycles.preview_pause = self.addon_prefs.render_pause
+			# Raycast to move the light compared to the targeted object
+			raycast_light(self, coord, context, light.Lumiere.range)
+
+		self.lumiere_area.tag_redraw()
+
 	def finish(self):
 		return {"FINISHED"}
 
@@ -478,6 +554,247 @@ class LUMIERE_OT_ray_operator(Operator):
 			_lumiere_coll = bpy.data.collections.new("Lumiere")
 			bpy.context.scene.collection.children.link(_lumiere_coll)
 
+# -------------------------------------------------------------------- #
+class LUMIERE_OT_place_lights(Operator):
+	"""Create and place a list of lights on their targets"""
+
+	bl_idname = "lumiere.place_lights"
+	bl_label = "Place lights"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	records : bpy.props.StringProperty(
+		description="JSON list of the lights to place, one dictionary per light with the keys :\n"+
+		"target, point or coord, reflect_angle, range, light_type and name")
+
+	def execute(self, context):
+		try:
+			records = json.loads(self.records)
+		except ValueError as error:
+			self.report({'ERROR'}, "Invalid light records: " + str(error))
+			return {'CANCELLED'}
+
+		if 'Lumiere' not in context.scene.collection.children.keys() :
+			_lumiere_coll = bpy.data.collections.new("Lumiere")
+			context.scene.collection.children.link(_lumiere_coll)
+
+		if not isinstance(records, list):
+			self.report({'ERROR'}, "Invalid light records: a list is expected")
+			return {'CANCELLED'}
+
+		lights, skipped = batch_place_lights(context, records)
+		for message in skipped:
+			self.report({'WARNING'}, "Light skipped, " + message)
+		self.report({'INFO'}, "%d of %d lights placed" % (len(lights), len(records)))
+
+		return {'FINISHED'}
+
+# -------------------------------------------------------------------- #
+class LUMIERE_OT_bake_sun_path(Operator):
+	"""Bake the sun of the frame range in keyframes on the sky and the linked light.
+	The sun is no more computed on each frame change"""
+
+	bl_idname = "lumiere.bake_sun_path"
+	bl_label = "Bake sun path"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.Lumiere.env_type == "Sky" and "Lumiere_world" in bpy.data.worlds
+
+	def execute(self, context):
+		scene = context.scene
+		light = scene.Lumiere.link_to_light
+
+		# Same hours as the frame change handler, clamped like the Hour property
+		frames = np.arange(scene.frame_start, scene.frame_end + 1, dtype=np.float64)
+		hours = np.clip(anim_hour(scene, frames), 0.0, 23.59)
+
+		locations, rotations = getSunPositions(localTime = hours, latitude = scene.Lumiere.env_latitude, longitude = scene.Lumiere.env_longitude, northOffset = 0.00, utcZone = 0, month = scene.Lumiere.env_month, day = scene.Lumiere.env_day, year = scene.Lumiere.env_year, distance = light.Lumiere.range if light is not None else 1)
+		bake_sun_states(scene, frames, locations, rotations)
+
+		# Also removes the frame change handler
+		scene.Lumiere.sun_baked = True
+
+		self.report({'INFO'}, "Sun path baked on %d frames" % len(frames))
+		return {'FINISHED'}
+
+# -------------------------------------------------------------------- #
+class LUMIERE_OT_clear_sun_path(Operator):
+	"""Remove the baked sun path, an animated sun is computed again on each frame change"""
+
+	bl_idname = "lumiere.clear_sun_path"
+	bl_label = "Clear sun path"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	def execute(self, context):
+		clear_baked_fcurves()
+		clear_sun_study_markers(context.scene)
+
+		# Frame range of the scene before the sun study
+		if context.scene.Lumiere.study_frame_saved:
+			context.scene.frame_start = context.scene.Lumiere.study_frame_start
+			context.scene.frame_end = context.scene.Lumiere.study_frame_end
+			context.scene.Lumiere.study_frame_saved = False
+
+		context.scene.Lumiere.sun_baked = False
+		update_env_hour(self, context)
+
+		return {'FINISHED'}
+
+# -------------------------------------------------------------------- #
+class LUMIERE_OT_sun_study(Operator):
+	"""Compute the sun for many dates and hours at once.
+	Each state is baked on its own frame with a timeline marker,
+	and the states can be rendered as an animation"""
+
+	bl_idname = "lumiere.sun_study"
+	bl_label = "Sun study"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	dates : bpy.props.EnumProperty(
+		name="Dates",
+		items=(
+			('SOLSTICES', "Solstices and equinoxes", "March 20, June 21, September 22 and December 21"),
+			('MONTHS', "Every month", "The 21st of each month"),
+			('CUSTOM', "Custom", "Dates given as month/day separated by commas")),
+		default='SOLSTICES')
+
+	custom_dates : bpy.props.StringProperty(
+		name="Custom dates",
+		description="Month/day separated by commas, 6/21, 12/21",
+		default="6/21, 12/21")
+
+	hour_start : bpy.props.FloatProperty(
+		name="From",
+		min=0, max=23.59,
+		subtype='TIME',
+		unit='TIME',
+		default=6)
+
+	hour_end : bpy.props.FloatProperty(
+		name="To",
+		min=0, max=23.59,
+		subtype='TIME',
+		unit='TIME',
+		default=20)
+
+	hour_step : bpy.props.FloatProperty(
+		name="Every",
+		min=0.1, max=12,
+		subtype='TIME',
+		unit='TIME',
+		default=1)
+
+	render : bpy.props.BoolProperty(
+		name="Render",
+		description="Render every state in the output folder, in a render job. The frame of each state has its marker",
+		default=False)
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.Lumiere.env_type == "Sky" and "Lumiere_world" in bpy.data.worlds
+
+	def invoke(self, context, event):
+		return context.window_manager.invoke_props_dialog(self)
+
+	def draw(self, context):
+		layout = self.layout
+		layout.prop(self, "dates")
+		if self.dates == 'CUSTOM':
+			layout.prop(self, "custom_dates", text="")
+		row = layout.row(align=True)
+		row.prop(self, "hour_start")
+		row.prop(self, "hour_end")
+		layout.prop(self, "hour_step")
+		layout.prop(self, "render")
+
+	def get_dates(self):
+		"""List of (month, day) of the study"""
+		if self.dates == 'SOLSTICES':
+			return [(3, 20), (6, 21), (9, 22), (12, 21)]
+		elif self.dates == 'MONTHS':
+			return [(month, 21) for month in range(1, 13)]
+
+		dates = []
+		for date in self.custom_dates.split(","):
+			if not date.strip():
+				continue
+			month, day = (int(v) for v in date.split("/"))
+			if not (1 <= month <= 12 and 1 <= day <= 31):
+				raise ValueError(date)
+			dates.append((month, day))
+		return dates
+
+	def execute(self, context):
+		scene = context.scene
+		light = scene.Lumiere.link_to_light
+
+		try:
+			dates = self.get_dates()
+		except ValueError:
+			self.report({'ERROR'}, "Invalid dates: " + self.custom_dates)
+			return {'CANCELLED'}
+
+		hours = np.arange(self.hour_start, self.hour_end + 1e-6, self.hour_step)
+		if not dates or not len(hours):
+			self.report({'ERROR'}, "Nothing to compute")
+			return {'CANCELLED'}
+
+		# Every hour of every date, solved in one call
+		months, days = (np.array(v, dtype=np.float64) for v in zip(*dates))
+		month_grid, hour_grid = np.meshgrid(months, hours, indexing='ij')
+		day_grid = np.meshgrid(days, hours, indexing='ij')[0]
+		locations, rotations = getSunPositions(localTime = hour_grid.ravel(), latitude = scene.Lumiere.env_latitude, longitude = scene.Lumiere.env_longitude, northOffset = 0.00, utcZone = 0, month = month_grid.ravel(), day = day_grid.ravel(), year = scene.Lumiere.env_year, distance = light.Lumiere.range if light is not None else 1)
+
+		frames = np.arange(scene.frame_start, scene.frame_start + len(rotations), dtype=np.float64)
+		bake_sun_states(scene, frames, locations, rotations)
+
+		clear_sun_study_markers(scene)
+		names = []
+		for frame, month, day, hour in zip(frames, month_grid.ravel(), day_grid.ravel(), hour_grid.ravel()):
+			# Rounded to the minute first, 6.9999 is 07:00
+			name = SUN_STUDY_MARKER + "%02d-%02d %02d:%02d" % ((month, day) + divmod(round(hour * 60), 60))
+			scene.timeline_markers.new(name, frame=int(frame))
+			names.append(name)
+
+		# The frame range is restored by the clear operator
+		if not scene.Lumiere.study_frame_saved:
+			scene.Lumiere.study_frame_start = scene.frame_start
+			scene.Lumiere.study_frame_end = scene.frame_end
+			scene.Lumiere.study_frame_saved = True
+		scene.frame_end = int(frames[-1])
+		scene.Lumiere.sun_baked = True
+
+		if self.render:
+			# The frames are rendered by a render job, the interface is not blocked.
+			# The output path is restored when the job ends
+			study_renders[scene.name] = scene.render.filepath
+			scene.render.filepath = os.path.join(scene.render.filepath, bpy.path.clean_name(SUN_STUDY_MARKER))
+			if sun_study_render_end not in bpy.app.handlers.render_complete:
+				bpy.app.handlers.render_complete.append(sun_study_render_end)
+				bpy.app.handlers.render_cancel.append(sun_study_render_end)
+			bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
+
+		self.report({'INFO'}, "Sun study of %d states" % len(frames))
+		return {'FINISHED'}
+
+# Output path of the scenes rendering a sun study
+study_renders = {}
+
+@persistent
+def sun_study_render_end(scene, depsgraph=None):
+	"""Restore the output path after the render job of a sun study"""
+	filepath = study_renders.pop(scene.name, None)
+	if filepath is not None:
+		scene.render.filepath = filepath
+	if not study_renders:
+		remove_sun_study_handlers()
+
+def remove_sun_study_handlers():
+	for handlers in (bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+		if sun_study_render_end in handlers:
+			handlers.remove(sun_study_render_end)
+
 # Utilities
 ###############################################
 # Get the region area where the operator is used
@@ -507,11 +824,7 @@ def check_region(self,context,event):
 
 # Check if the object selected is a light from Lumiere
 def check_light_selected(self, context):
-	if (context.view_layer.objects.active is not None):
-			if context.view_layer.objects.active.name in context.scene.collection.children['Lumiere'].all_objects:
-				self.light_selected = True
-			else:
-				self.light_selected = False
+	self.light_selected = is_lumiere(context.scene, context.view_layer.objects.active)
 
 
 # -------------------------------------------------------------------- #
@@ -687,6 +1000,10 @@ class LUMIERE_OT_SelectPixel(Operator):
 classes = [
 	LUMIERE_OT_export_light,
 	LUMIERE_OT_ray_operator,
+	LUMIERE_OT_place_lights,
+	LUMIERE_OT_bake_sun_path,
+	LUMIERE_OT_clear_sun_path,
+	LUMIERE_OT_sun_study,
 	PRESET_OT_actions,
 	LUMIERE_OT_PresetPopup,
 	LUMIERE_OT_SelectPixel,
@@ -702,4 +1019,5 @@ def unregister():
 	from bpy.utils import unregister_class
 	for cls in reversed(classes):
 		unregister_class(cls)
+	remove_sun_study_handlers()
 	del bpy.types.Scene.is_running
@@ -0,0 +1,155 @@
+import numpy as np
+
+# -------------------------------------------------------------------- #
+## Placement kernel
+# Pure NumPy version of the reflect rules used to place a light on a target.
+# Every function works on arrays of N rows so many lights can be placed in
+# one call, and nothing here depends on bpy.
+
+REFLECT_MODES = ("Accurate", "Normal", "Estimated")
+
+# -------------------------------------------------------------------- #
+def normalize(vectors):
+	"""Normalize the rows of a (N, 3) array, null vectors are left null"""
+	vectors = np.asarray(vectors, dtype=np.float64)
+	length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+	return np.divide(vectors, length, out=np.zeros_like(vectors), where=length > 0.0)
+
+# -------------------------------------------------------------------- #
+def reflect_directions(modes, view_vectors, normals, hits, centers=None, flip=None):
+	"""Direction from the hit point to the light for each reflect mode.
+	Accurate: the view vector reflected by the normal.
+	Normal: the normal of the face, inverted when flip is True (Lumiere targets).
+	Estimated: from the bounding box center of the target to the hit point"""
+
+	modes = np.asarray(modes)
+	if modes.dtype.kind in "US":
+		modes = np.array([REFLECT_MODES.index(mode) for mode in modes])
+	view_vectors = np.asarray(view_vectors, dtype=np.float64)
+	normals = normalize(normals)
+	hits = np.asarray(hits, dtype=np.float64)
+
+	# Same as mathutils Vector.reflect
+	dot = np.einsum('ij,ij->i', view_vectors, normals)[:, None]
+	directions = view_vectors - 2.0 * dot * normals
+
+	normal_mode = modes == 1
+	if normal_mode.any():
+		sign = np.ones(len(hits))
+		if flip is not None:
+			sign[np.asarray(flip, dtype=bool)] = -1.0
+		directions[normal_mode] = (normals * sign[:, None])[normal_mode]
+
+	estimated = modes == 2
+	if estimated.any():
+		directions[estimated] = normalize(hits - np.asarray(centers, dtype=np.float64))[estimated]
+
+	return directions
+
+# -------------------------------------------------------------------- #
+def light_locations(hits, directions, ranges):
+	"""Location of the lights : hit + direction * range"""
+	ranges = np.asarray(ranges, dtype=np.float64).reshape(-1, 1)
+	return np.asarray(hits, dtype=np.float64) + np.asarray(directions, dtype=np.float64) * ranges
+
+# -------------------------------------------------------------------- #
+def quaternions_to_matrices(quats):
+	"""(N, 4) w, x, y, z quaternions to (N, 3, 3) rotation matrices"""
+	w, x, y, z = (quats[:, i] for i in range(4))
+	mat = np.empty((len(quats), 3, 3), dtype=quats.dtype)
+	mat[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+	mat[:, 0, 1] = 2.0 * (x * y - w * z)
+	mat[:, 0, 2] = 2.0 * (x * z + w * y)
+	mat[:, 1, 0] = 2.0 * (x * y + w * z)
+	mat[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+	mat[:, 1, 2] = 2.0 * (y * z - w * x)
+	mat[:, 2, 0] = 2.0 * (x * z - w * y)
+	mat[:, 2, 1] = 2.0 * (y * z + w * x)
+	mat[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+	return mat
+
+# -------------------------------------------------------------------- #
+def track_quaternions(directions):
+	"""Same as mathutils Vector.to_track_quat('Z', 'Y') for each row"""
+
+	# Single precision like Blender, so the flips around the poles match
+	directions = np.asarray(directions, dtype=np.float32)
+	length = np.linalg.norm(directions, axis=1)
+	valid = length > 0.0
+	length = np.where(valid, length, np.float32(1.0))
+	x, y, z = directions[:, 0], directions[:, 1], directions[:, 2]
+
+	# Rotate the Z axis on the direction
+	nor = np.stack((-y, x, np.zeros_like(x)), axis=1)
+	nor[np.abs(x) + np.abs(y) < 0.0001, 0] = 1.0
+	nor /= np.linalg.norm(nor, axis=1, keepdims=True)
+	angle = np.float32(0.5) * np.arccos(np.clip(z / length, -1.0, 1.0))
+	quats = np.concatenate((np.cos(angle)[:, None], nor * np.sin(angle)[:, None]), axis=1)
+
+	# Then roll around the direction to keep the Y axis up
+	fp = quaternions_to_matrices(quats)[:, :, 2]
+	angle = np.float32(-0.5) * np.arctan2(-fp[:, 0], -fp[:, 1])
+	co = np.cos(angle)
+	si = np.sin(angle) / length
+
+	w1, x1, y1, z1 = co, x * si, y * si, z * si
+	w2, x2, y2, z2 = (quats[:, i] for i in range(4))
+	quats = np.stack((
+		w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+		w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+		w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+		w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+		), axis=1)
+
+	quats[~valid] = (1.0, 0.0, 0.0, 0.0)
+	return quats.astype(np.float64)
+
+# -------------------------------------------------------------------- #
+def matrices_to_eulers(mat):
+	"""(N, 3, 3) rotation matrices to XYZ eulers, with the smallest of the
+	two solutions as picked by mathutils Matrix.to_euler"""
+
+	cy = np.hypot(mat[:, 0, 0], mat[:, 1, 0])
+	regular = cy > 16.0 * np.finfo(np.float32).eps
+
+	eul1 = np.stack((
+		np.where(regular, np.arctan2(mat[:, 2, 1], mat[:, 2, 2]), np.arctan2(-mat[:, 1, 2], mat[:, 1, 1])),
+		np.arctan2(-mat[:, 2, 0], cy),
+		np.where(regular, np.arctan2(mat[:, 1, 0], mat[:, 0, 0]), 0.0),
+		), axis=1)
+	eul2 = np.where(regular[:, None], np.stack((
+		np.arctan2(-mat[:, 2, 1], -mat[:, 2, 2]),
+		np.arctan2(-mat[:, 2, 0], -cy),
+		np.arctan2(-mat[:, 1, 0], -mat[:, 0, 0]),
+		), axis=1), eul1)
+
+	second = np.abs(eul1).sum(axis=1) > np.abs(eul2).sum(axis=1)
+	return np.where(second[:, None], eul2, eul1)
+
+# -------------------------------------------------------------------- #
+def track_eulers(directions):
+	"""Rotation of the lights looking along the directions, as XYZ eulers"""
+	return matrices_to_eulers(quaternions_to_matrices(track_quaternions(directions)))
+
+# -------------------------------------------------------------------- #
+def spherical_angles(offsets):
+	"""Rotation (azimuth in [0, 360[) and pitch of the light around its hit, in degrees"""
+
+	offsets = np.asarray(offsets, dtype=np.float64)
+	r = np.linalg.norm(offsets, axis=1)
+	rotation = np.degrees(np.arctan2(offsets[:, 1], offsets[:, 0]))
+	rotation = np.where(rotation < 0, rotation + 360, rotation)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		pitch = np.degrees(np.arccos(np.clip(offsets[:, 2] / r, -1.0, 1.0)))
+	return rotation, pitch
+
+# -------------------------------------------------------------------- #
+def place_lights(modes, view_vectors, normals, hits, ranges, centers=None, flip=None):
+	"""Full placement of N lights on their hit points.
+	Return the directions, locations, XYZ eulers, rotations and pitches"""
+
+	directions = reflect_directions(modes, view_vectors, normals, hits, centers, flip)
+	locations = light_locations(hits, directions, ranges)
+	eulers = track_eulers(directions)
+	rotations, pitches = spherical_angles(locations - np.asarray(hits, dtype=np.float64))
+	return directions, locations, eulers, rotations, pitches
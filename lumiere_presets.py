@@ -0,0 +1,282 @@
+import bpy
+import os
+import json
+import atexit
+import time
+import sqlite3
+import threading
+
+from bpy.app.handlers import persistent
+
+# -------------------------------------------------------------------- #
+## Preset store
+# The exported lights and groups are kept in a SQLite database next to the
+# add-on, one row per light or group. Exporting or removing a preset only
+# writes its own row in a transaction, instead of writing the whole library.
+# The list of the presets and the decoded presets are cached between the
+# popups, and read again only when the database file changes on disk.
+# The popup only reads the name, count and type columns from a covering
+# index, a preset body is decoded when it is imported.
+# The rows are serialized on the main thread, then written behind by a
+# thread with its own connection. A burst of exports is written in one
+# transaction, and the rows waiting to be written are flushed before a
+# file is loaded and when the add-on is unregistered.
+
+PRESETS_DB = os.path.join(os.path.dirname(__file__), "lumiere_presets.db")
+# The library of the previous versions, imported in the database once
+PRESETS_JSON = os.path.join(os.path.dirname(__file__), "lumiere_dictionary.json")
+
+SCHEMA_VERSION = 2
+GROUP_PREFIX = "Group_"
+# Type of the group presets in the index
+GROUP_TYPE = "Group"
+
+# Seconds the writer waits for more exports before writing
+WRITE_DELAY = 0.2
+
+INSERT_PRESET = "INSERT OR REPLACE INTO presets (key, name, is_group, count, light_type, body) VALUES (?, ?, ?, ?, ?, ?)"
+
+# -------------------------------------------------------------------- #
+def preset_type(key, value):
+	"""Light type of a preset, GROUP_TYPE for a group"""
+	if key.startswith(GROUP_PREFIX):
+		return GROUP_TYPE
+	return value.get("Lumiere", {}).get("light_type", "")
+
+# -------------------------------------------------------------------- #
+class PresetStore:
+	"""Lights and groups presets, keyed like the former JSON dictionary :
+	the light name, or Group_ followed by the group name"""
+
+	def __init__(self, path = PRESETS_DB, json_path = PRESETS_JSON):
+		self.path = path
+		self.json_path = json_path
+		self.connection = None
+		# (path, mtime, size) of the database the cache was read from
+		self.signature = None
+		# {key: (name, count, light_type)} of all the presets, and {key: preset} of the decoded ones
+		self.index = None
+		self.bodies = {}
+		# {key: row} waiting to be written by the writer thread, None to delete
+		self.pending = {}
+		self.writing = False
+		self.flushing = False
+		self.stopping = False
+		self.writer = None
+		self.lock = threading.Condition()
+
+	def connect(self):
+		"""Open the database, create the tables and import the JSON file the first time"""
+		if self.connection is None:
+			self.connection = sqlite3.connect(self.path)
+			self.upgrade()
+			self.migrate()
+		return self.connection
+
+	def upgrade(self):
+		"""Create or upgrade the tables to the current schema version"""
+		connection = self.connection
+		with connection:
+			connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+			row = connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+			version = int(row[0]) if row is not None else 0
+
+			if version < 1:
+				connection.execute(
+					"CREATE TABLE presets ("
+					"key TEXT PRIMARY KEY, "
+					"name TEXT NOT NULL, "
+					"is_group INTEGER NOT NULL, "
+					"count INTEGER NOT NULL, "
+					"body TEXT NOT NULL)")
+				connection.execute("CREATE INDEX presets_name ON presets (name)")
+
+			# Type of the light in the index, and a covering index of the
+			# columns of the popup so the bodies are not read to list them
+			if version < 2:
+				connection.execute("ALTER TABLE presets ADD COLUMN light_type TEXT NOT NULL DEFAULT ''")
+				connection.executemany("UPDATE presets SET light_type = ? WHERE key = ?",
+					[(preset_type(key, json.loads(body)), key) for key, body in connection.execute("SELECT key, body FROM presets")])
+				connection.execute("DROP INDEX IF EXISTS presets_name")
+				connection.execute("CREATE INDEX presets_index ON presets (name, key, count, light_type)")
+
+			connection.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+	def close(self):
+		"""Write the pending rows, stop the writer and close the database"""
+		self.flush()
+		if self.writer is not None:
+			with self.lock:
+				self.stopping = True
+				self.lock.notify_all()
+			self.writer.join()
+			self.writer = None
+			self.stopping = False
+		if self.connection is not None:
+			self.connection.close()
+			self.connection = None
+		self.clear()
+
+	def clear(self):
+		self.signature = None
+		self.index = None
+		self.bodies = {}
+
+	def stat(self):
+		try:
+			stat = os.stat(self.path)
+		except OSError:
+			return None
+		return (self.path, stat.st_mtime_ns, stat.st_size)
+
+	def refresh(self):
+		"""Read the list of the presets again if the database changed on disk"""
+		connection = self.connect()
+		with self.lock:
+			# The file changes under our own writes
+			if self.index is not None and (self.pending or self.writing):
+				return
+			signature = self.stat()
+		if self.index is None or signature != self.signature:
+			self.index = {key: (name, count, light_type) for key, name, count, light_type in
+				connection.execute("SELECT key, name, count, light_type FROM presets INDEXED BY presets_index")}
+			self.bodies = {}
+			self.signature = signature
+
+	def get_meta(self, key, default = None):
+		row = self.connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		return row[0] if row is not None else default
+
+	def migrate(self):
+		"""Import lumiere_dictionary.json, the file is left untouched"""
+		if self.get_meta("json_migrated") is not None or not os.path.isfile(self.json_path):
+			return
+
+		try:
+			with open(self.json_path, 'r', encoding='utf-8') as file:
+				presets = json.load(file)
+		except (OSError, ValueError):
+			print("Lumiere: %s can't be read, the presets are not imported" % self.json_path)
+			return
+
+		with self.connection:
+			self.connection.executemany(INSERT_PRESET, [self.row(key, value) for key, value in presets.items()])
+			self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (self.json_path,))
+		print("Lumiere: %d presets imported from %s" % (len(presets), self.json_path))
+
+	@staticmethod
+	def row(key, value):
+		"""Database row of a preset"""
+		is_group = key.startswith(GROUP_PREFIX)
+		name = key[len(GROUP_PREFIX):] if is_group else key
+		count = len(value) if is_group else 1
+		return (key, name, int(is_group), count, preset_type(key, value), json.dumps(value, sort_keys=True, ensure_ascii=False))
+
+	def items(self):
+		"""List of (key, name, count, light_type) of all the presets"""
+		self.refresh()
+		return [(key,) + values for key, values in sorted(self.index.items())]
+
+	def get(self, key):
+		"""Dict of a preset, None if it does not exist.
+		The dict is shared with the cache and must not be modified"""
+		self.refresh()
+		with self.lock:
+			if key in self.pending and self.pending[key] is None:
+				return None
+		if key not in self.bodies:
+			row = self.connection.execute("SELECT body FROM presets WHERE key = ?", (key,)).fetchone()
+			if row is None:
+				return None
+			self.bodies[key] = json.loads(row[0])
+		return self.bodies[key]
+
+	def put(self, presets):
+		"""Add or replace the presets of a dict {key: preset}"""
+		self.refresh()
+		rows = [self.row(key, value) for key, value in presets.items()]
+
+		# The cache is updated now, the rows are written behind
+		for key, name, is_group, count, light_type, body in rows:
+			self.index[key] = (name, count, light_type)
+			self.bodies[key] = json.loads(body)
+		self.queue({row[0]: row for row in rows})
+
+	def remove(self, key):
+		self.refresh()
+		self.index.pop(key, None)
+		self.bodies.pop(key, None)
+		self.queue({key: None})
+
+	# ---- #
+	def queue(self, rows):
+		"""Hand rows to the writer thread, started the first time"""
+		with self.lock:
+			self.pending.update(rows)
+			if self.writer is None or not self.writer.is_alive():
+				self.writer = threading.Thread(target=self.write_loop, name="Lumiere presets writer", daemon=True)
+				self.writer.start()
+			self.lock.notify_all()
+
+	def write_loop(self):
+		connection = sqlite3.connect(self.path)
+		try:
+			while True:
+				with self.lock:
+					while not self.pending and not self.stopping:
+						self.lock.wait()
+					if not self.pending:
+						return
+					# Gather a burst of exports, unless a flush is waiting.
+					# Each export wakes the writer, so wait up to a deadline
+					deadline = time.monotonic() + WRITE_DELAY
+					while not self.flushing and not self.stopping:
+						remaining = deadline - time.monotonic()
+						if remaining <= 0.0:
+							break
+						self.lock.wait(remaining)
+					pending, self.pending = self.pending, {}
+					self.writing = True
+
+				try:
+					with connection:
+						connection.executemany(INSERT_PRESET, [row for row in pending.values() if row is not None])
+						connection.executemany("DELETE FROM presets WHERE key = ?", [(key,) for key, row in pending.items() if row is None])
+				except sqlite3.Error as error:
+					print("Lumiere: %d presets can't be saved, %s" % (len(pending), error))
+
+				with self.lock:
+					self.writing = False
+					self.signature = self.stat()
+					self.lock.notify_all()
+		finally:
+			connection.close()
+
+	def flush(self):
+		"""Wait until the pending rows are written"""
+		with self.lock:
+			self.flushing = True
+			self.lock.notify_all()
+			while (self.pending or self.writing) and self.writer is not None and self.writer.is_alive():
+				self.lock.wait(0.1)
+			self.flushing = False
+
+preset_store = PresetStore()
+
+# Blender can quit without unregistering the add-on
+atexit.register(preset_store.close)
+
+@persistent
+def lumiere_presets_load_pre(dummy):
+	preset_store.flush()
+
+# -------------------------------------------------------------------- #
+## Register
+
+def register():
+	bpy.app.handlers.load_pre.append(lumiere_presets_load_pre)
+
+def unregister():
+	bpy.app.handlers.load_pre.remove(lumiere_presets_load_pre)
+	preset_store.close()
+	atexit.unregister(preset_store.close)
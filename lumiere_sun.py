@@ -0,0 +1,376 @@
+import numpy as np
+
+from collections import OrderedDict
+
+from math import (
+	degrees,
+	radians,
+	floor,
+	sin,
+	asin,
+	tan,
+	cos,
+	acos,
+	atan2,
+	sqrt,
+	pi,
+	)
+
+# -------------------------------------------------------------------- #
+## Solar position
+# No dependency on bpy so it can be used and tested outside of Blender.
+
+def getSunPosition(localTime = 12.0, latitude = 48.87, longitude = 2.67, northOffset = 1.00, utcZone = 0, month = 12, day = 22, year = 2012, distance = 5):
+	"""
+	Compute the sun position based on latitude and longitude
+	The sun position is from the addon 'sun_position' from Michael Martin (xaire)
+	https://archive.blender.org/wiki/index.php/Extensions:2.6/Py/Scripts/3D_interaction/Sun_Position/
+	"""
+
+	longitude *= -1                 # for internal calculations
+	utcTime = localTime + utcZone   # Set Greenwich Meridian Time
+
+	if latitude > 89.93:            # Latitude 90 and -90 gives
+		latitude = radians(89.93)  # erroneous results so nudge it
+	elif latitude < -89.93:
+		latitude = radians(-89.93)
+	else:
+		latitude = radians(latitude)
+
+	t = julianTimeFromY2k(utcTime, year, month, day)
+
+	e = radians(obliquityCorrection(t))
+	L = apparentLongitudeOfSun(t)
+	solarDec = sunDeclination(e, L)
+	eqtime = calcEquationOfTime(t)
+
+	timeCorrection = (eqtime - 4 * longitude) + 60 * utcZone
+	trueSolarTime = ((utcTime - utcZone) * 60.0 + timeCorrection) % 1440
+
+	hourAngle = trueSolarTime / 4.0 - 180.0
+	if hourAngle < -180.0:
+		hourAngle += 360.0
+
+	csz = (sin(latitude) * sin(solarDec) +
+		   cos(latitude) * cos(solarDec) *
+		   cos(radians(hourAngle)))
+
+	if csz > 1.0:
+		csz = 1.0
+	elif csz < -1.0:
+		csz = -1.0
+
+	zenith = acos(csz)
+
+	azDenom = cos(latitude) * sin(zenith)
+
+	if abs(azDenom) > 0.001:
+		azRad = ((sin(latitude) *
+				  cos(zenith)) - sin(solarDec)) / azDenom
+		if abs(azRad) > 1.0:
+			azRad = -1.0 if (azRad < 0.0) else 1.0
+		azimuth = 180.0 - degrees(acos(azRad))
+		if hourAngle > 0.0:
+			azimuth = -azimuth
+	else:
+		azimuth = 180.0 if (latitude > 0.0) else 0.0
+
+	if azimuth < 0.0:
+		azimuth = azimuth + 360.0
+
+	exoatmElevation = 90.0 - degrees(zenith)
+
+	if exoatmElevation > 85.0:
+		refractionCorrection = 0.0
+	else:
+		te = tan(radians(exoatmElevation))
+		if exoatmElevation > 5.0:
+			refractionCorrection = (
+				58.1 / te - 0.07 / (te ** 3) + 0.000086 / (te ** 5))
+		elif (exoatmElevation > -0.575):
+			s1 = (-12.79 + exoatmElevation * 0.711)
+			s2 = (103.4 + exoatmElevation * (s1))
+			s3 = (-518.2 + exoatmElevation * (s2))
+			refractionCorrection = 1735.0 + exoatmElevation * (s3)
+		else:
+			refractionCorrection = -20.774 / te
+
+		refractionCorrection = refractionCorrection / 3600
+
+	solarElevation = 90.0 - degrees(zenith)
+
+	solarAzimuth = azimuth + northOffset
+
+	Sun_AzNorth = solarAzimuth
+
+	Sun_Theta = pi / 2 - radians(solarElevation)
+	Sun_Phi = radians(solarAzimuth) * -1
+
+	location = setSunPosition(Sun_Theta, Sun_Phi, distance)
+
+	rotation = ((radians(solarElevation - 90), 0, radians(-solarAzimuth)))
+
+	return location, rotation
+
+def setSunPosition(Sun_Theta, Sun_Phi, distance = 1):
+
+	locX = sin(Sun_Phi) * sin(-Sun_Theta) * distance
+	locY = sin(Sun_Theta) * cos(Sun_Phi) * distance
+	locZ = cos(Sun_Theta) * distance
+
+	try:
+		return (locX, locY, locZ)
+	except:
+		pass
+
+
+def sunDeclination(e, L):
+	return (asin(sin(e) * sin(L)))
+
+
+def calcEquationOfTime(t):
+	epsilon = obliquityCorrection(t)
+	ml = radians(meanLongitudeSun(t))
+	e = eccentricityEarthOrbit(t)
+	m = radians(meanAnomalySun(t))
+	y = tan(radians(epsilon) / 2.0)
+	y = y * y
+	sin2ml = sin(2.0 * ml)
+	cos2ml = cos(2.0 * ml)
+	sin4ml = sin(4.0 * ml)
+	sinm = sin(m)
+	sin2m = sin(2.0 * m)
+	etime = (y * sin2ml - 2.0 * e * sinm + 4.0 * e * y *
+			 sinm * cos2ml - 0.5 * y ** 2 * sin4ml - 1.25 * e ** 2 * sin2m)
+	return (degrees(etime) * 4)
+
+def obliquityCorrection(t):
+	ec = obliquityOfEcliptic(t)
+	omega = 125.04 - 1934.136 * t
+	return (ec + 0.00256 * cos(radians(omega)))
+
+def obliquityOfEcliptic(t):
+	return ((23.0 + 26.0 / 60 + (21.4480 - 46.8150) / 3600 * t -
+			(0.00059 / 3600) * t ** 2 + (0.001813 / 3600) * t ** 3))
+
+def julianTimeFromY2k(utcTime, year, month, day):
+	century = 36525.0  # Days in Julian Century
+	epoch = 2451545.0  # Julian Day for 1/1/2000 12:00 gmt
+	jd = getJulianDay(year, month, day)
+	return ((jd + (utcTime / 24)) - epoch) / century
+
+def getJulianDay(year, month, day):
+	if month <= 2:
+		year -= 1
+		month += 12
+	A = floor(year / 100)
+	B = 2 - A + floor(A / 4.0)
+	jd = (floor((365.25 * (year + 4716.0))) +
+		 floor(30.6001 * (month + 1)) + day + B - 1524.5)
+	return jd
+
+def apparentLongitudeOfSun(t):
+	return (radians(trueLongitudeOfSun(t) - 0.00569 - 0.00478 *
+			sin(radians(125.04 - 1934.136 * t))))
+
+
+def trueLongitudeOfSun(t):
+	return (meanLongitudeSun(t) + equationOfSunCenter(t))
+
+def meanLongitudeSun(t):
+	return (280.46646 + 36000.76983 * t + 0.0003032 * t ** 2) % 360
+
+
+def eccentricityEarthOrbit(t):
+	return (0.016708634 - 0.000042037 * t - 0.0000001267 * t ** 2)
+
+def equationOfSunCenter(t):
+	m = radians(meanAnomalySun(t))
+	c = ((1.914602 - 0.004817 * t - 0.000014 * t ** 2) * sin(m) +
+		(0.019993 - 0.000101 * t) * sin(m * 2) +
+		 0.000289 * sin(m * 3))
+	return c
+
+def meanAnomalySun(t):
+	return (357.52911 + t * (35999.05029 - 0.0001537 * t))
+
+# -------------------------------------------------------------------- #
+def getSunPositions(localTime = 12.0, latitude = 48.87, longitude = 2.67, northOffset = 1.00, utcZone = 0, month = 12, day = 22, year = 2012, distance = 5):
+	"""
+	Array version of getSunPosition, every argument can be a NumPy array
+	and they are broadcast together.
+	Return the (N, 3) locations and (N, 3) rotations of the sun
+	"""
+
+	localTime, latitude, longitude, northOffset, utcZone, month, day, year, distance = np.broadcast_arrays(
+		*(np.asarray(v, dtype=np.float64) for v in (localTime, latitude, longitude, northOffset, utcZone, month, day, year, distance)))
+
+	longitude = -longitude
+	utcTime = localTime + utcZone
+
+	# Latitude 90 and -90 gives erroneous results so nudge it
+	latitude = np.radians(np.clip(latitude, -89.93, 89.93))
+
+	t = julianTimesFromY2k(utcTime, year, month, day)
+
+	# Obliquity correction, apparent longitude and declination of the sun
+	omega = np.radians(125.04 - 1934.136 * t)
+	epsilon = (23.0 + 26.0 / 60 + (21.4480 - 46.8150) / 3600 * t -
+			(0.00059 / 3600) * t ** 2 + (0.001813 / 3600) * t ** 3) + 0.00256 * np.cos(omega)
+	e = np.radians(epsilon)
+
+	ml = (280.46646 + 36000.76983 * t + 0.0003032 * t ** 2) % 360
+	m = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+	center = ((1.914602 - 0.004817 * t - 0.000014 * t ** 2) * np.sin(m) +
+		(0.019993 - 0.000101 * t) * np.sin(m * 2) +
+		0.000289 * np.sin(m * 3))
+	L = np.radians(ml + center - 0.00569 - 0.00478 * np.sin(omega))
+	solarDec = np.arcsin(np.sin(e) * np.sin(L))
+
+	# Equation of time
+	ecc = 0.016708634 - 0.000042037 * t - 0.0000001267 * t ** 2
+	y = np.tan(e / 2.0) ** 2
+	ml = np.radians(ml)
+	etime = (y * np.sin(2.0 * ml) - 2.0 * ecc * np.sin(m) + 4.0 * ecc * y *
+			 np.sin(m) * np.cos(2.0 * ml) - 0.5 * y ** 2 * np.sin(4.0 * ml) - 1.25 * ecc ** 2 * np.sin(2.0 * m))
+	eqtime = np.degrees(etime) * 4
+
+	timeCorrection = (eqtime - 4 * longitude) + 60 * utcZone
+	trueSolarTime = ((utcTime - utcZone) * 60.0 + timeCorrection) % 1440
+
+	hourAngle = trueSolarTime / 4.0 - 180.0
+	hourAngle = np.where(hourAngle < -180.0, hourAngle + 360.0, hourAngle)
+
+	csz = (np.sin(latitude) * np.sin(solarDec) +
+		   np.cos(latitude) * np.cos(solarDec) *
+		   np.cos(np.radians(hourAngle)))
+	zenith = np.arccos(np.clip(csz, -1.0, 1.0))
+
+	azDenom = np.cos(latitude) * np.sin(zenith)
+	regular = np.abs(azDenom) > 0.001
+	with np.errstate(divide='ignore', invalid='ignore'):
+		azRad = ((np.sin(latitude) * np.cos(zenith)) - np.sin(solarDec)) / azDenom
+	azimuth = 180.0 - np.degrees(np.arccos(np.clip(azRad, -1.0, 1.0)))
+	azimuth = np.where(hourAngle > 0.0, -azimuth, azimuth)
+	azimuth = np.where(regular, azimuth, np.where(latitude > 0.0, 180.0, 0.0))
+	azimuth = np.where(azimuth < 0.0, azimuth + 360.0, azimuth)
+
+	solarElevation = 90.0 - np.degrees(zenith)
+	solarAzimuth = azimuth + northOffset
+
+	Sun_Theta = pi / 2 - np.radians(solarElevation)
+	Sun_Phi = -np.radians(solarAzimuth)
+
+	locations = np.stack((
+		np.sin(Sun_Phi) * np.sin(-Sun_Theta) * distance,
+		np.sin(Sun_Theta) * np.cos(Sun_Phi) * distance,
+		np.cos(Sun_Theta) * distance,
+		), axis=-1).reshape(-1, 3)
+
+	rotations = np.stack((
+		np.radians(solarElevation - 90),
+		np.zeros_like(solarElevation),
+		np.radians(-solarAzimuth),
+		), axis=-1).reshape(-1, 3)
+
+	return locations, rotations
+
+def sun_directions(rotations):
+	"""Direction of the sun for the Sky Texture from (N, 3) sun rotations, as computed in update_sky"""
+	rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3)
+	x = rotations[:, 0]
+	z = rotations[:, 2]
+	return np.stack((np.sin(z) * np.sin(x), -np.cos(z) * np.sin(x), np.cos(x)), axis=1)
+
+def julianTimesFromY2k(utcTime, year, month, day):
+	"""Array version of julianTimeFromY2k"""
+	early = month <= 2
+	year = np.where(early, year - 1, year)
+	month = np.where(early, month + 12, month)
+	A = np.floor(year / 100)
+	B = 2 - A + np.floor(A / 4.0)
+	jd = (np.floor(365.25 * (year + 4716.0)) +
+		 np.floor(30.6001 * (month + 1)) + day + B - 1524.5)
+	return ((jd + (utcTime / 24)) - 2451545.0) / 36525.0
+
+# -------------------------------------------------------------------- #
+## Sun state cache
+# The sun of a whole day is solved at once on a fine time grid, then the
+# states in between are interpolated. Scrubbing the hour only reads the
+# table of the day, a new day or place solves a new table.
+
+class SunCache:
+	"""LRU cache of the sun directions per (latitude, longitude, year, month, day).
+	The locations stay within 1e-6 of getSunPosition per unit of distance,
+	except when the sun passes close to the zenith or the nadir. There, while
+	cos(latitude) * sin(zenith angle) < 0.001, getSunPosition snaps the azimuth
+	to the meridian and the cache follows the actual path of the sun, the
+	locations differ by up to 0.001 / cos(latitude) per unit of distance"""
+
+	def __init__(self, step = 1.0 / 60.0, size = 32):
+		# Hours between two samples, one minute by default
+		self.step = step
+		# Number of days kept
+		self.size = size
+		self.hours = np.linspace(0.0, 24.0, int(round(24.0 / step)) + 1)
+		self.tables = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def clear(self):
+		self.tables.clear()
+		self.hits = 0
+		self.misses = 0
+
+	def table(self, latitude, longitude, year, month, day):
+		"""Unit vectors of the sun over the day"""
+		key = (round(latitude, 6), round(longitude, 6), int(year), int(month), int(day))
+		table = self.tables.get(key)
+		if table is not None:
+			self.hits += 1
+			self.tables.move_to_end(key)
+			return table
+
+		self.misses += 1
+		locations, rotations = getSunPositions(localTime = self.hours, latitude = latitude, longitude = longitude, northOffset = 0.00, utcZone = 0, month = month, day = day, year = year, distance = 1)
+		# The directions are interpolated instead of the angles, the azimuth
+		# turns fast when the sun goes close to the zenith.
+		# Plain lists, reading NumPy scalars one by one is slower
+		table = (locations[:, 0].tolist(), locations[:, 1].tolist(), locations[:, 2].tolist())
+		self.tables[key] = table
+		if len(self.tables) > self.size:
+			self.tables.popitem(last=False)
+		return table
+
+	def rotation(self, localTime, latitude, longitude, year, month, day):
+		"""Rotation of the sun, interpolated between the two nearest samples"""
+		xs, ys, zs = self.table(latitude, longitude, year, month, day)
+		position = min(max(localTime, 0.0), 24.0) / self.step
+		index = min(int(position), len(xs) - 2)
+		t = position - index
+		x = xs[index] + (xs[index + 1] - xs[index]) * t
+		y = ys[index] + (ys[index + 1] - ys[index]) * t
+		z = zs[index] + (zs[index + 1] - zs[index]) * t
+		length = sqrt(x * x + y * y + z * z)
+		# Back to the rotation, in the range of getSunPosition
+		azimuth = atan2(-x, y)
+		return (-acos(min(max(z / length, -1.0), 1.0)), 0.0, -((-azimuth) % (2 * pi)))
+
+	def position(self, localTime, latitude, longitude, year, month, day, distance = 1):
+		"""Same result as getSunPosition with northOffset and utcZone at 0"""
+		rotation = self.rotation(localTime, latitude, longitude, year, month, day)
+		x, y, z = rotation
+		location = (sin(z) * sin(x) * distance, -cos(z) * sin(x) * distance, cos(x) * distance)
+		return location, rotation
+
+	def stats(self):
+		"""Lookups served from a cached day"""
+		lookups = self.hits + self.misses
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": self.hits / lookups if lookups else 0.0,
+			"days": len(self.tables),
+			}
+
+sun_cache = SunCache()
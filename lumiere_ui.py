@@ -6,18 +6,15 @@ from bl_operators.presets import AddPresetBase
 from bl_ui.utils import PresetPanel
 
 from .lumiere_utils import (
-	get_lumiere_dict,
-	update_lumiere_dict,
 	get_mat_name,
 	cartesian_coordinates,
-	getSunPosition,
 	update_sky,
+	update_shadow,
 	)
 
 from .lumiere_materials import (
 	update_mat,
 	softbox_mat,
-	lamp_mat,
 	update_lamp,
 	create_world,
 	update_world,
@@ -28,6 +25,20 @@ from .lumiere_lights import (
 	create_lamp,
 	)
 
+from .lumiere_sun import (
+	sun_cache,
+	)
+
+from .lumiere_presets import (
+	GROUP_TYPE,
+	)
+
+from .lumiere_cache import (
+	is_lumiere,
+	lumiere_count,
+	invalidate_lumiere_indices,
+	)
+
 from math import (
 	degrees,
 	radians,
@@ -77,29 +88,33 @@ def update_type_light(self, context):
 		if light.Lumiere.light_type == "Softbox":
 			lamp = bpy.data.lights[light.data.name]
 			bpy.data.lights.remove(lamp, do_unlink=True, do_id_user=True, do_ui_user=True)
+			invalidate_lumiere_indices()
 			if values['old_name'] in bpy.data.objects:
 				for ob in  bpy.data.objects:
 					if ob.data.name == values['old_name']:
 						light = ob
 			else:
 				light = create_softbox(values['old_name'])
-				light.data.name = values['old_name']
 				light['Lumiere'] = lumiere_dict[values['old_name']]
 				light.location = lumiere_dict[values['old_name']]["location"]
 				light.rotation_euler = lumiere_dict[values['old_name']]["rotation"]
 				light.Lumiere.scale_x = light.Lumiere.scale_x
 				update_mat(self, context)
 		else:
-			if values['old_type'] != context.object.data.type:
-				context.object.data.type = values['old_type']
+			if values['old_type'] != light.data.type:
+				light.data.type = values['old_type']
 				light.Lumiere.scale_x = light.Lumiere.scale_x
 
 #-- The light is a mesh to be replaced by a lamp
 	elif light.type == "MESH" and light.Lumiere.light_type != "Softbox":
 		new_type = light.Lumiere.light_type
 
-		# Delete the old mesh from the collection
-		mesh = bpy.data.meshes[light.data.name]
+		# Delete the old softbox, its mesh can be shared with linked duplicates
+		mesh = light.data
+		bpy.data.objects.remove(light, do_unlink=True)
+		invalidate_lumiere_indices()
+		if mesh.users == 0:
+			bpy.data.meshes.remove(mesh)
 
 		# Create a new light
 		light = create_lamp(type = new_type, name = values['old_name'])
@@ -110,8 +125,6 @@ def update_type_light(self, context):
 
 		update_lamp(light)
 
-		bpy.data.meshes.remove(mesh, do_unlink=True, do_id_user=True, do_ui_user=True)
-
 	# Set default position to "Estimated"
 	light.Lumiere.reflect_angle = "Estimated"
 
@@ -172,14 +185,7 @@ def update_rotation_pitch(self,context):
 
 	# Update the shadow location
 	if context.scene.is_running == False:
-		light.parent.hide_viewport = True
-		result, hit_location, _, _, _, _ = context.scene.ray_cast(context.view_layer, light.location, (Vector(light.Lumiere.hit) - light.location))
-
-		if result:
-			light.Lumiere.shadow = hit_location
-		else:
-			light.Lumiere.shadow = (0,0,0)
-		light.parent.hide_viewport = False
+		update_shadow(context, light, light.parent)
 
 
 # -------------------------------------------------------------------- #
@@ -232,7 +238,7 @@ def update_light_hour(self,context):
 		light = context.scene.Lumiere.link_to_light
 		light.Lumiere.light_mode = "Sky"
 
-		light.location , light.rotation_euler = getSunPosition(localTime = context.scene.Lumiere.env_hour, latitude = context.scene.Lumiere.env_latitude, longitude = context.scene.Lumiere.env_longitude, northOffset = 0.00, utcZone = 0, month = context.scene.Lumiere.env_month, day = context.scene.Lumiere.env_day, year = context.scene.Lumiere.env_year, distance = light.Lumiere.range)
+		light.location , light.rotation_euler = sun_cache.position(localTime = context.scene.Lumiere.env_hour, latitude = context.scene.Lumiere.env_latitude, longitude = context.scene.Lumiere.env_longitude, year = context.scene.Lumiere.env_year, month = context.scene.Lumiere.env_month, day = context.scene.Lumiere.env_day, distance = light.Lumiere.range)
 
 		update_sky(self, context, light.rotation_euler, light)
 
@@ -243,10 +249,22 @@ def update_env_hour(self,context):
 	if context.scene.Lumiere.link_to_light is not None:
 		update_light_hour(self,context)
 	else:
-		location , rotation = getSunPosition(localTime = context.scene.Lumiere.env_hour, latitude = context.scene.Lumiere.env_latitude, longitude = context.scene.Lumiere.env_longitude, northOffset = 0.00, utcZone = 0, month = context.scene.Lumiere.env_month, day = context.scene.Lumiere.env_day, year = context.scene.Lumiere.env_year, distance = 1)
+		location , rotation = sun_cache.position(localTime = context.scene.Lumiere.env_hour, latitude = context.scene.Lumiere.env_latitude, longitude = context.scene.Lumiere.env_longitude, year = context.scene.Lumiere.env_year, month = context.scene.Lumiere.env_month, day = context.scene.Lumiere.env_day, distance = 1)
 
 		update_sky(self, context, rotation)
 
+# -------------------------------------------------------------------- #
+def update_sun_animation(self,context):
+	"""Add or remove the frame change handler"""
+	sync_anim_handler()
+
+# -------------------------------------------------------------------- #
+def update_show_sun_path(self,context):
+	"""Redraw the viewports with or without the sun path"""
+	for area in context.screen.areas:
+		if area.type == 'VIEW_3D':
+			area.tag_redraw()
+
 # -------------------------------------------------------------------- #
 def update_lock_scale(self,context):
 	"""Update the scale xy of the light"""
@@ -337,15 +355,13 @@ def update_range(self,context):
 def target_poll(self, object):
 	"""Target only this object"""
 
-	if object.name not in bpy.context.scene.collection.children['Lumiere'].all_objects:
-		return object
+	return not is_lumiere(bpy.context.scene, object)
 
 # -------------------------------------------------------------------- #
 def link_light_poll(self, object):
 	"""Link only this light"""
 
-	if object.name in bpy.context.scene.collection.children['Lumiere'].all_objects:
-		return object
+	return is_lumiere(bpy.context.scene, object)
 
 # -------------------------------------------------------------------- #
 def update_select_only(self, context):
@@ -486,12 +502,31 @@ class LumiereAddonPreferences(bpy.types.AddonPreferences):
 							   description="Pause the render during interactive to save time",
 							   default=False)
 
+#---Interactive refresh rate
+	interactive_rate : IntProperty(
+							   name="Interactive Rate",
+							   description="Maximum number of light updates per second during interactive mode.\n"+
+							   "The mouse moves received in between are merged in the next update",
+							   min=1,
+							   max=240,
+							   default=60)
+
 	def draw(self, context):
 		layout = self.layout
 		layout.prop(self, "gizmos")
 		layout.prop(self, "render_pause")
+		layout.prop(self, "interactive_rate")
 
 # -------------------------------------------------------------------- #
+# Icons of the light types in the presets list
+PRESET_ICONS = {
+	"Softbox": "MESH_PLANE",
+	"Point": "LIGHT_POINT",
+	"Sun": "LIGHT_SUN",
+	"Spot": "LIGHT_SPOT",
+	"Area": "LIGHT_AREA",
+	}
+
 class LightsProp(bpy.types.PropertyGroup):
 	num : StringProperty(
 						name="Number",
@@ -501,6 +536,10 @@ class LightsProp(bpy.types.PropertyGroup):
 						name="Name",
 						description="Name of the light or group",
 						)
+	light_type : StringProperty(
+						name="Type",
+						description="Type of the light, Group for a group",
+						)
 # -------------------------------------------------------------------- #
 ## Snene Properties
 class LumiereScn(bpy.types.PropertyGroup):
@@ -675,6 +714,58 @@ class LumiereScn(bpy.types.PropertyGroup):
 						   update=update_env_hour,
 						   )
 
+#---Sun position: Animation
+	sun_animation : BoolProperty(
+						   name="Animate sun",
+						   description="Compute the hour of the sun from the current frame",
+						   default=False,
+						   update=update_sun_animation)
+
+#---Sun position: Hour of the frame 0
+	anim_start_hour : FloatProperty(
+						   name="Start hour",
+						   description="Hour of the sun on the frame 0",
+						   min=0, max=23.59,
+						   subtype='TIME',
+						   unit='TIME',
+						   default=5)
+
+#---Sun position: Hours per frame
+	anim_hour_per_frame : FloatProperty(
+						   name="Hours per frame",
+						   description="Time of the sun between two frames, in hours",
+						   min=-24, max=24,
+						   precision=3,
+						   default=0.05)
+
+#---Sun position: Baked animation
+	sun_baked : BoolProperty(
+						   name="Sun path baked",
+						   description="The sun path is played from keyframes instead of being computed on each frame",
+						   default=False,
+						   update=update_sun_animation)
+
+#---Sun position: Frame range of the scene before a sun study
+	study_frame_saved : BoolProperty(
+						   name="Frame range saved",
+						   description="The frame range is restored when the sun path is cleared",
+						   default=False)
+
+	study_frame_start : IntProperty(
+						   name="Frame start before the sun study",
+						   default=1)
+
+	study_frame_end : IntProperty(
+						   name="Frame end before the sun study",
+						   default=250)
+
+#---Sun position: Sun path overlay
+	show_sun_path : BoolProperty(
+						   name="Show sun path",
+						   description="Show the daily arc and the analemma of the sun in the viewport",
+						   default=False,
+						   update=update_show_sun_path)
+
 #---List of lights
 	light_type : EnumProperty(name="Light type:",
 								description="List of lights sources:\n"+
@@ -1077,10 +1168,10 @@ class ALL_LIGHTS_UL_list(bpy.types.UIList):
 		if self.layout_type in {'DEFAULT', 'COMPACT'}:
 			split = layout.split(factor=0.2)
 			split.label(text="%d" % (index))
-			if int(item.num) > 1:
+			if item.light_type == GROUP_TYPE:
 				split.prop(item, "name", text="", toggle=False, emboss=False, icon_value=icon, icon="GROUP")
 			else:
-				split.prop(item, "name", text="", toggle=False, emboss=False, icon_value=icon, icon="LIGHT")
+				split.prop(item, "name", text="", toggle=False, emboss=False, icon_value=icon, icon=PRESET_ICONS.get(item.light_type, "LIGHT"))
 			split.prop(item, "num", text="", toggle=False, emboss=False, icon_value=icon, icon="BLANK1")
 		elif self.layout_type in {'GRID'}:
 			pass
@@ -1094,12 +1185,7 @@ class POLL_PT_Lumiere:
 	@classmethod
 	def poll(cls, context):
 		if context.scene.Lumiere.main_menu=="Light":
-			if (context.active_object is not None):
-				if ("Lumiere" in str(context.active_object.users_collection)) \
-				and len(list(context.scene.collection.children['Lumiere'].objects)) > 0 :
-					return context.view_layer.objects.active.name in context.scene.collection.children['Lumiere'].all_objects
-			else:
-				return False
+			return is_lumiere(context.scene, context.active_object)
 		else:
 			return True
 
@@ -1217,10 +1303,7 @@ class MAINWORLD_PT_Lumiere(Panel):
 	bl_category = "Lumiere"
 
 	def light_in_scene(self, context):
-		if (context.active_object is not None) and "Lumiere" in str(context.active_object.users_collection) and len(list(context.scene.collection.children['Lumiere'].objects)) > 0:
-			return True
-		else:
-			return False
+		return is_lumiere(context.scene, context.active_object)
 
 	def draw_header_preset(self, context):
 		scene = context.scene
@@ -1248,7 +1331,7 @@ class MAINWORLD_PT_Lumiere(Panel):
 		row = col.row(align=True)
 		col.prop(scene.Lumiere, "env_type", text="")
 		if scene.Lumiere.env_type == "Texture":
-			if context.scene.Lumiere.env_hdr_name !="" or context.scene.Lumiere.env_reflect_name !="" and len(list(context.scene.collection.children['Lumiere'].objects)) > 0:
+			if context.scene.Lumiere.env_hdr_name !="" or context.scene.Lumiere.env_reflect_name !="" and lumiere_count(context.scene) > 0:
 				row = col.row(align=True)
 				row.label(text="Link to :")
 				row.prop(context.scene.Lumiere, "link_to_light", text="")
@@ -1270,8 +1353,24 @@ class MAINWORLD_PT_Lumiere(Panel):
 			col.prop(context.scene.Lumiere, "env_day", text="Day")
 			col.prop(context.scene.Lumiere, "env_month", text="Month")
 			col.prop(context.scene.Lumiere, "env_year", text="Year")
+			stats = sun_cache.stats()
+			if stats["hits"] + stats["misses"]:
+				col.label(text="Sun cache : %.0f%% of %d lookups" % (stats["hit_rate"] * 100, stats["hits"] + stats["misses"]), icon="INFO")
+			col.separator()
+			col.prop(context.scene.Lumiere, "sun_animation", text="Animate sun")
+			if context.scene.Lumiere.sun_animation:
+				sub = col.column(align=True)
+				sub.prop(context.scene.Lumiere, "anim_start_hour", text="Start")
+				sub.prop(context.scene.Lumiere, "anim_hour_per_frame", text="Hours per frame")
+			row = col.row(align=True)
+			if context.scene.Lumiere.sun_baked:
+				row.operator("lumiere.clear_sun_path", text="Clear sun path", icon="X")
+			else:
+				row.operator("lumiere.bake_sun_path", text="Bake sun path", icon="REC")
+			row.operator("lumiere.sun_study", text="Sun study", icon="LIGHT_SUN")
+			col.prop(context.scene.Lumiere, "show_sun_path", text="Show sun path")
 			col.separator()
-			if len(list(context.scene.collection.children['Lumiere'].objects)) > 0:
+			if lumiere_count(context.scene) > 0:
 				row = col.row(align=True)
 				row.label(text="Link to :")
 				row.prop(context.scene.Lumiere, "link_to_light", text="")
@@ -1284,10 +1383,7 @@ class WORLD_PT_Lumiere_environment(Panel):
 	bl_category = "Lumiere"
 
 	def light_in_scene(self, context):
-		if (context.active_object is not None) and "Lumiere" in str(context.active_object.users_collection) and len(list(context.scene.collection.children['Lumiere'].objects)) > 0:
-			return True
-		else:
-			return False
+		return is_lumiere(context.scene, context.active_object)
 
 	def draw_header_preset(self, context):
 		scene = context.scene
@@ -1336,10 +1432,7 @@ class WORLD_PT_Lumiere_reflection(Panel):
 	bl_category = "Lumiere"
 
 	def light_in_scene(self, context):
-		if (context.active_object is not None) and "Lumiere" in str(context.active_object.users_collection) and len(list(context.scene.collection.children['Lumiere'].objects)) > 0:
-			return True
-		else:
-			return False
+		return is_lumiere(context.scene, context.active_object)
 
 	def draw_header_preset(self, context):
 		scene = context.scene
@@ -1759,10 +1852,8 @@ class OPERATOR_PT_Lumiere(Panel):
 
 	@classmethod
 	def poll(cls, context):
-		if (context.active_object is not None):
-			if ("Lumiere" in str(context.active_object.users_collection)) \
-			and len(list(context.scene.collection.children['Lumiere'].objects)) > 0 :
-				return context.view_layer.objects.active.name not in context.scene.collection.children['Lumiere'].all_objects
+		if is_lumiere(context.scene, context.active_object):
+			return False
 		return context.scene.Lumiere.main_menu=="Light"
 
 	def draw_header_preset(self, context):
@@ -1787,14 +1878,40 @@ class OPERATOR_PT_Lumiere(Panel):
 
 # -------------------------------------------------------------------- #
 from bpy.app.handlers import persistent
+def anim_hour(scene, frame):
+	"""Hour of the animated sun on a frame, frame can be an array"""
+	return scene.Lumiere.anim_start_hour + (frame * scene.Lumiere.anim_hour_per_frame)
+
 @persistent
-def anim(self):
+def anim(scene, depsgraph=None):
+
+	# The baked sun path is played by the keyframes
+	if not scene.Lumiere.sun_animation or scene.Lumiere.sun_baked:
+		return
+
+	# Clamped like the Hour property, the sun stays still past the end of the day
+	hour = min(max(anim_hour(scene, scene.frame_current), 0.0), 23.59)
+	if abs(hour - scene.Lumiere.env_hour) < 0.0001:
+		return
 
 	# bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
-	bpy.context.scene.Lumiere.env_hour = 5 + (bpy.context.scene.frame_current * 0.05)
+	scene.Lumiere.env_hour = hour
 	bpy.context.view_layer.update()
 	# bpy.context.scene.frame_set(bpy.context.scene.frame_current)
 
+def sync_anim_handler():
+	"""Only keep the frame change handler while a scene animates a sun that is not baked"""
+	needed = any(scene.Lumiere.sun_animation and not scene.Lumiere.sun_baked for scene in bpy.data.scenes)
+	handlers = bpy.app.handlers.frame_change_post
+	if needed and anim not in handlers:
+		handlers.append(anim)
+	elif not needed and anim in handlers:
+		handlers.remove(anim)
+
+@persistent
+def anim_load_post(dummy):
+	sync_anim_handler()
+
 # -------------------------------------------------------------------- #
 ## Register
 classes = [
@@ -1823,18 +1940,26 @@ def register():
 	from bpy.utils import register_class
 	for cls in classes:
 		register_class(cls)
-	bpy.app.handlers.frame_change_post.append(anim)
 	bpy.types.Object.Lumiere = bpy.props.PointerProperty(type=LumiereObj)
 	bpy.types.Scene.Lumiere = bpy.props.PointerProperty(type=LumiereScn)
 	bpy.types.Scene.Lumiere_lights_list = bpy.props.CollectionProperty(type=LightsProp)
 	bpy.types.Scene.Lumiere_lights_list_index = bpy.props.IntProperty(name = "Index", default = 0)
+	bpy.app.handlers.load_post.append(anim_load_post)
+	# The scenes can't be read while registering
+	bpy.app.timers.register(sync_anim_handler, first_interval=0.0)
 
 
 def unregister():
 	from bpy.utils import unregister_class
 	for cls in reversed(classes):
 		unregister_class(cls)
-	bpy.app.handlers.frame_change_post.remove(anim)
+	# Only registered while a sun is animated
+	if anim in bpy.app.handlers.frame_change_post:
+		bpy.app.handlers.frame_change_post.remove(anim)
+	bpy.app.handlers.load_post.remove(anim_load_post)
+	if bpy.app.timers.is_registered(sync_anim_handler):
+		bpy.app.timers.unregister(sync_anim_handler)
+	sun_cache.clear()
 	del bpy.types.Object.Lumiere
 	del bpy.types.Scene.Lumiere
 	del bpy.types.Scene.Lumiere_lights_list
@@ -1,78 +1,52 @@
 import bpy
-import os
-import json
 import bgl
 import gpu
-import time
 import sys
+import numpy as np
 
 from gpu_extras.batch import batch_for_shader
+from .lumiere_cache import (
+	get_scene_bvh,
+	get_bbox_center,
+	is_lumiere,
+	sky_nodes,
+	)
+from .lumiere_placement import (
+	reflect_directions,
+	light_locations,
+	track_eulers,
+	spherical_angles,
+	place_lights,
+	REFLECT_MODES,
+	)
+from .lumiere_lights import (
+	create_softbox,
+	create_lamp,
+	)
+from .lumiere_sun import (
+	sun_directions,
+	)
 from bpy_extras import view3d_utils
 from mathutils import (
 				Vector,
-				Matrix,
-				Quaternion,
-				Euler
 				)
-from textwrap import wrap
 from math import (
 	degrees,
 	radians,
-	floor,
 	sin,
-	asin,
-	tan,
 	cos,
 	sqrt,
-	atan,
-	atan2,
-	acos,
 	pi,
 	)
 
 # -------------------------------------------------------------------- #
-def raycast_light(self, event, context, range, shadow=False, shadow_hit=None, ray_max=1000.0):
+def raycast_light(self, coord, context, range, shadow=False, shadow_hit=None, ray_max=1000.0):
 	"""Compute the location and rotation of the light from the angle or normal of the targeted face off the object"""
 
-	length_squared = 0
 	scene = context.scene
 	light = context.active_object
 	rv3d = context.region_data
 	region = context.region
-	coord = (event.mouse_region_x, event.mouse_region_y)
-
-# -------------------------------------------------------------------- #
-	# Select the targeted object
-	def visible_objects_and_duplis():
-		if light.Lumiere.target :
-			obj_trgt = light.Lumiere.target
-			yield (obj_trgt, obj_trgt.matrix_world.copy())
-		else:
-			for dup in depsgraph.object_instances:
-				if dup.object.name not in context.scene.collection.children['Lumiere'].all_objects or \
-				(dup.object.name in context.scene.collection.children['Lumiere'].all_objects and \
-				(dup.object.Lumiere.color_type == 'Reflector' and dup.object.data.name != light.data.name)):
-
-					if dup.is_instance:
-						yield (dup.instance_object, dup.instance_object.matrix_world.copy())
-					else:
-						yield (dup.object.original, dup.object.original.matrix_world.copy())
-
-# -------------------------------------------------------------------- #
-	def obj_ray_cast(obj_trgt, matrix):
-		# Get the ray direction from the view angle to the targeted object
-		matrix_inv = matrix.inverted()
-		ray_origin_obj = matrix_inv @ ray_origin
-		ray_target_obj = matrix_inv @ ray_target
-		ray_direction_obj = ray_target_obj - ray_origin_obj
-
-		# Cast the ray to the targeted object
-		success, hit, normal, face_index = obj_trgt.ray_cast(ray_origin_obj, ray_direction_obj)
-
-		if success:
-			return hit, normal, face_index
-		else:
-			return None, None, None
 
 # -------------------------------------------------------------------- #
 	def link_to_light():
@@ -87,112 +61,80 @@ def raycast_light(self, event, context, range, shadow=False, shadow_hit=None, ra
 	view_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, (coord))
 	# 3d view origin vector from the region
 	ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, (coord))
-	# Define a default direction vector
-	ray_target = ray_origin + view_vector
 
-	depsgraph =  context.evaluated_depsgraph_get()
+	lumiere_objects = context.scene.collection.children['Lumiere'].all_objects
+
+	# Select the targeted object, the lights are ignored except for the reflectors
+	if light.Lumiere.target :
+		names = (light.Lumiere.target.name,)
+		exclude = ()
+	else:
+		names = None
+		exclude = {obj.name for obj in lumiere_objects if obj.Lumiere.color_type != 'Reflector' or obj.name == light.name}
 
 	# Find the closest object
-	best_length_squared = -1.0
 	best_obj = None
+	result = get_scene_bvh(context.scene).ray_cast(context, ray_origin, view_vector, names=names, exclude=exclude)
 
 	# Find the position of the light using the reflect angle and the object targeted normal
-	for obj_trgt, matrix_trgt in visible_objects_and_duplis():
-		if obj_trgt.type == 'MESH':
-			hit, normal_trgt, face_index = obj_ray_cast(obj_trgt, matrix_trgt)
-
-			if hit is not None :
-				hit_world = matrix_trgt @ hit
-				length_squared = (hit_world - ray_origin).length_squared
-
-				if best_obj is None or length_squared < best_length_squared:
-					best_length_squared = length_squared
-					best_obj = obj_trgt
-
-					# Get the normal of the face from the targeted object
-					normal = matrix_trgt.to_3x3().inverted().transposed() @ normal_trgt
-					normal.normalize()
-
-					# Define the direction based on the normal of the targeted object, the view angle or the bounding box
-					if shadow:
-						reflect_dir = Vector(shadow_hit) - Vector(light.Lumiere.shadow)
-						reflect_dir.normalize()
-						light_loc = Vector(shadow_hit) + (reflect_dir * range)
-					else:
-						if light.Lumiere.reflect_angle == "Accurate":
-							reflect_dir = (view_vector).reflect(normal)
-
-						elif light.Lumiere.reflect_angle == "Normal":
-							if obj_trgt.name in context.scene.collection.children['Lumiere'].all_objects:
-								reflect_dir = -normal
-							else:
-								reflect_dir = normal
-
-						elif light.Lumiere.reflect_angle == "Estimated":
-							if light.Lumiere.auto_bbox_center:
-								local_bbox_center = 0.125 * sum((Vector(b) for b in obj_trgt.bound_box), Vector())
-								global_bbox_center = obj_trgt.matrix_world @ local_bbox_center
-								light.Lumiere.bbox_center = global_bbox_center
-							else:
-								global_bbox_center = Vector(light.Lumiere.bbox_center)
-							reflect_dir = (matrix_trgt @ hit) - global_bbox_center
-							reflect_dir.normalize()
-
-						# Define light location : Hit + Direction + Range
-						light_loc = (matrix_trgt @ hit) + (reflect_dir * range)
-
-					_matrix_trgt = matrix_trgt
-					_hit = hit
-					_light_loc = light_loc
-					_direction = reflect_dir
-
-					# Parent the light to the target object
-					if not shadow:
-						light.parent = obj_trgt
-						light.matrix_parent_inverse = matrix_trgt.inverted()
+	if result is not None:
+		name, hit_world, normal, face_index, distance = result
+		best_obj = bpy.data.objects[name]
+		matrix_trgt = best_obj.matrix_world.copy()
+
+		# Define the direction based on the normal of the targeted object, the view angle or the bounding box
+		if shadow:
+			hit_point = Vector(shadow_hit)
+			direction = hit_point - Vector(light.Lumiere.shadow)
+			direction.normalize()
+		else:
+			hit_point = hit_world
+			global_bbox_center = None
+			if light.Lumiere.reflect_angle == "Estimated":
+				if light.Lumiere.auto_bbox_center:
+					global_bbox_center = get_bbox_center(context, best_obj)
+					light.Lumiere.bbox_center = global_bbox_center
+				else:
+					global_bbox_center = Vector(light.Lumiere.bbox_center)
+
+			direction = Vector(reflect_directions(
+				(light.Lumiere.reflect_angle,), (view_vector,), (normal,), (hit_world,),
+				centers=(global_bbox_center,), flip=(is_lumiere(context.scene, best_obj),))[0])
+
+		# Parent the light to the target object
+		if not shadow:
+			light.parent = best_obj
+			light.matrix_parent_inverse = matrix_trgt.inverted()
 
 	# Define location, rotation and scale
-	if length_squared > 0 :
+	if best_obj is not None :
 
 		if self.shift :
-			track  = light.location - Vector(_matrix_trgt @ _hit)
-			rotaxis = (track.to_track_quat('Z','Y')).to_euler()
+			track = light.location - hit_world
 		else :
-			rotaxis = (_direction.to_track_quat('Z','Y')).to_euler()
-			light.location = Vector((_light_loc[0], _light_loc[1], _light_loc[2]))
+			# Define light location : Hit + Direction + Range
+			track = direction
+			light.location = Vector(light_locations((hit_point,), (direction,), (range,))[0])
 
 		if not shadow:
-			light.Lumiere.hit = (_matrix_trgt @ _hit)
+			light.Lumiere.hit = hit_world
 
 		# Update rotation and pitch for spherical coordinate
-		x,y,z = light.location - Vector((light.Lumiere.hit))
-		r = sqrt(x**2 + y**2 + z**2)
-		theta = atan2(y, x)
-		if degrees(theta) < 0:
-			theta = radians(degrees(theta) + 360)
-		light.Lumiere.rotation = degrees(theta)
-		phi = acos( z / r )
+		rotation, pitch = spherical_angles((light.location - Vector((light.Lumiere.hit)),))
+		light.Lumiere.rotation = rotation[0]
 
 		# Do not update if linked to an environment texture
 		if not (context.scene.Lumiere.env_type == "Texture" and link_to_light()):
-			light.Lumiere.pitch = degrees(phi)
-			light.rotation_euler = rotaxis
+			light.Lumiere.pitch = pitch[0]
+			light.rotation_euler = track_eulers((track,))[0]
 
-		light.Lumiere.direction = _direction
+		light.Lumiere.direction = direction
 
 		light.Lumiere.light_mode = "None"
 
 		# Shadow location
 		if not shadow:
-			best_obj.hide_viewport = True
-			result2, hit_location, face_normal, face_index, object2, matrix2 = context.scene.ray_cast(context.view_layer, light.location, (Vector(light.Lumiere.hit) - light.location))
-			if result2:
-				light.Lumiere.shadow = hit_location
-				# self.shadow = True
-			else:
-				# self.shadow = False
-				light.Lumiere.shadow = (0,0,0)
-			best_obj.hide_viewport = False
+			update_shadow(context, light, best_obj)
 
 		if link_to_light():
 			if context.scene.Lumiere.env_type == "Sky":
@@ -206,6 +148,149 @@ def raycast_light(self, event, context, range, shadow=False, shadow_hit=None, ra
 
 
 
+# -------------------------------------------------------------------- #
+LIGHT_TYPES = ("Softbox", "Point", "Sun", "Spot", "Area")
+
+def check_light_record(record):
+	"""Return why a record of batch_place_lights is invalid, or None"""
+	if not isinstance(record, dict):
+		return "a record is not a dictionary"
+	if not isinstance(record.get("target"), str):
+		return "a record has no target"
+	# The coord is used first when both are given
+	position = record.get("coord", record.get("point"))
+	if not isinstance(position, (list, tuple)) or len(position) != (2 if "coord" in record else 3) \
+		or not all(isinstance(value, (int, float)) for value in position):
+		return "the record of %s has no valid point or coord" % record["target"]
+	if record.get("reflect_angle", "Estimated") not in REFLECT_MODES:
+		return "unknown reflect_angle %s for %s" % (record["reflect_angle"], record["target"])
+	if record.get("light_type", "Softbox") not in LIGHT_TYPES:
+		return "unknown light_type %s for %s" % (record["light_type"], record["target"])
+	light_range = record.get("range", 2.0)
+	if not isinstance(light_range, (int, float)) or light_range <= 0:
+		return "invalid range for %s" % record["target"]
+	return None
+
+def batch_place_lights(context, records):
+	"""Create and place a list of lights on their targets in one pass.
+	Each record is a dictionary with the keys :
+	target : name of the targeted object
+	point : surface point in world space, or coord : (x, y) in the 3d view region,
+	only from a 3d view
+	reflect_angle : Accurate, Normal or Estimated (default Estimated)
+	range : distance of the light from the surface (default 2)
+	light_type : Softbox, Point, Sun, Spot or Area (default Softbox)
+	name : name of the light (default Lumiere)
+	All the records are checked before any light is created, the invalid ones,
+	those with a missing target and the coords outside a 3d view are skipped.
+	Return the list of the lights created and the list of the skipped records"""
+
+	scene_bvh = get_scene_bvh(context.scene)
+	rv3d = context.region_data
+	region = context.region
+
+	hits = []
+	normals = []
+	view_vectors = []
+	centers = []
+	flips = []
+	placed = []
+	skipped = []
+
+	# Find all the hits before any light is added to the scene
+	for record in records:
+		error = check_light_record(record)
+		if error is not None:
+			skipped.append(error)
+			continue
+
+		target = bpy.data.objects.get(record["target"])
+		if target is None:
+			skipped.append("%s not found" % record["target"])
+			continue
+
+		if "coord" in record:
+			if rv3d is None:
+				skipped.append("no 3d view for the coord of %s, use a point" % target.name)
+				continue
+			view_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, record["coord"])
+			ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, record["coord"])
+			result = scene_bvh.ray_cast(context, ray_origin, view_vector, names=(target.name,))
+			if result is None:
+				continue
+			hit, normal = result[1], result[2]
+		else:
+			result = scene_bvh.find_nearest(context, target.name, Vector(record["point"]))
+			if result is None:
+				continue
+			hit, normal = result[0], result[1]
+			# Look from the viewport if any, else straight on the surface
+			if rv3d is not None:
+				view_vector = (hit - rv3d.view_matrix.inverted().translation).normalized()
+			else:
+				view_vector = -normal
+
+		hits.append(hit)
+		normals.append(normal)
+		view_vectors.append(view_vector)
+		centers.append(get_bbox_center(context, target))
+		flips.append(is_lumiere(context.scene, target))
+		placed.append((record, target))
+
+	if not placed:
+		return [], skipped
+
+	modes = [record.get("reflect_angle", "Estimated") for record, target in placed]
+	ranges = [record.get("range", 2.0) for record, target in placed]
+	directions, locations, eulers, rotations, pitches = place_lights(
+		modes, view_vectors, normals, hits, ranges, centers=centers, flip=flips)
+
+	# Create the lights, the values are written as id properties
+	# so the update callbacks are not run for each of them
+	lights = []
+	for i, (record, target) in enumerate(placed):
+		light_type = record.get("light_type", "Softbox")
+		name = record.get("name", "Lumiere")
+		if light_type == "Softbox":
+			light = create_softbox(name)
+		else:
+			light = create_lamp(type = light_type, name = name)
+
+		light.parent = target
+		light.matrix_parent_inverse = target.matrix_world.inverted()
+		light.location = locations[i]
+		light.rotation_euler = eulers[i]
+		light.Lumiere.hit = hits[i]
+		light.Lumiere.direction = directions[i]
+		light.Lumiere.bbox_center = centers[i]
+		light.Lumiere["reflect_angle"] = ("Estimated", "Accurate", "Normal").index(modes[i])
+		light.Lumiere["range"] = ranges[i]
+		light.Lumiere["rotation"] = rotations[i]
+		light.Lumiere["pitch"] = pitches[i]
+		light.Lumiere.light_mode = "None"
+		lights.append(light)
+
+	for light in lights:
+		update_shadow(context, light, light.parent)
+
+	return lights, skipped
+
+# -------------------------------------------------------------------- #
+def update_shadow(context, light, target=None):
+	"""Find the shadow of the target from the light, ignoring the target and the lights"""
+
+	exclude = {obj.name for obj in context.scene.collection.children['Lumiere'].all_objects}
+	if target is not None:
+		exclude.add(target.name)
+
+	direction = Vector(light.Lumiere.hit) - light.location
+	result = get_scene_bvh(context.scene).ray_cast(context, light.location, direction, exclude=exclude)
+
+	if result is not None:
+		light.Lumiere.shadow = result[1]
+	else:
+		light.Lumiere.shadow = (0,0,0)
+
 # -------------------------------------------------------------------- #
 def create_2d_circle(step, radius, rotation = 0, center_x=0, center_y=0):
 	""" Create the vertices of a 2d circle at (0,0) """
@@ -325,34 +410,6 @@ def get_mat_name(light):
 
 	return(mat)
 
-# -------------------------------------------------------------------- #
-def get_lumiere_dict():
-	"""Return the file of the exported lights in a dict format"""
-
-	current_file_dir = os.path.dirname(__file__)
-	file_name = os.path.join(current_file_dir, "lumiere_dictionary.json")
-
-		# Try to open the Lumiere export dictionary
-	try:
-		with open(file_name, 'r', encoding='utf-8') as file:
-			my_dict = json.loads(file.read())
-			file.close()
-	except :
-		# print("\n[Lumiere ERROR]\n")
-		# import traceback
-		# traceback.print_exc()
-		my_dict = {}
-	return(my_dict)
-
-# -------------------------------------------------------------------- #
-def update_lumiere_dict(my_dict):
-	"""Update the file of the exported lights"""
-	current_file_dir = os.path.dirname(__file__)
-
-	with open(current_file_dir + "\\" + "lumiere_dictionary.json", "w", encoding='utf-8') as file:
-		json.dump(my_dict, file, sort_keys=True, indent=4, ensure_ascii=False)
-	file.close()
-
 # -------------------------------------------------------------------- #
 def cartesian_coordinates(r, theta, phi, hit=(0,0,0)):
 	"""Return the cartesian coordinates from a radius, inclination (phi) and azimuth (theta)"""
@@ -365,204 +422,91 @@ def cartesian_coordinates(r, theta, phi, hit=(0,0,0)):
 	return Vector((x, y, z))
 
 # -------------------------------------------------------------------- #
-def getSunPosition(localTime = 12.0, latitude = 48.87, longitude = 2.67, northOffset = 1.00, utcZone = 0, month = 12, day = 22, year = 2012, distance = 5):
-	"""
-	Compute the sun position based on latitude and longitude
-	The sun position is from the addon 'sun_position' from Michael Martin (xaire)
-	https://archive.blender.org/wiki/index.php/Extensions:2.6/Py/Scripts/3D_interaction/Sun_Position/
-	"""
-
-	longitude *= -1                 # for internal calculations
-	utcTime = localTime + utcZone   # Set Greenwich Meridian Time
-
-	if latitude > 89.93:            # Latitude 90 and -90 gives
-		latitude = radians(89.93)  # erroneous results so nudge it
-	elif latitude < -89.93:
-		latitude = radians(-89.93)
-	else:
-		latitude = radians(latitude)
-
-	t = julianTimeFromY2k(utcTime, year, month, day)
-
-	e = radians(obliquityCorrection(t))
-	L = apparentLongitudeOfSun(t)
-	solarDec = sunDeclination(e, L)
-	eqtime = calcEquationOfTime(t)
-
-	timeCorrection = (eqtime - 4 * longitude) + 60 * utcZone
-	trueSolarTime = ((utcTime - utcZone) * 60.0 + timeCorrection) % 1440
-
-	hourAngle = trueSolarTime / 4.0 - 180.0
-	if hourAngle < -180.0:
-		hourAngle += 360.0
-
-	csz = (sin(latitude) * sin(solarDec) +
-		   cos(latitude) * cos(solarDec) *
-		   cos(radians(hourAngle)))
-
-	if csz > 1.0:
-		csz = 1.0
-	elif csz < -1.0:
-		csz = -1.0
-
-	zenith = acos(csz)
-
-	azDenom = cos(latitude) * sin(zenith)
-
-	if abs(azDenom) > 0.001:
-		azRad = ((sin(latitude) *
-				  cos(zenith)) - sin(solarDec)) / azDenom
-		if abs(azRad) > 1.0:
-			azRad = -1.0 if (azRad < 0.0) else 1.0
-		azimuth = 180.0 - degrees(acos(azRad))
-		if hourAngle > 0.0:
-			azimuth = -azimuth
-	else:
-		azimuth = 180.0 if (latitude > 0.0) else 0.0
-
-	if azimuth < 0.0:
-		azimuth = azimuth + 360.0
-
-	exoatmElevation = 90.0 - degrees(zenith)
-
-	if exoatmElevation > 85.0:
-		refractionCorrection = 0.0
-	else:
-		te = tan(radians(exoatmElevation))
-		if exoatmElevation > 5.0:
-			refractionCorrection = (
-				58.1 / te - 0.07 / (te ** 3) + 0.000086 / (te ** 5))
-		elif (exoatmElevation > -0.575):
-			s1 = (-12.79 + exoatmElevation * 0.711)
-			s2 = (103.4 + exoatmElevation * (s1))
-			s3 = (-518.2 + exoatmElevation * (s2))
-			refractionCorrection = 1735.0 + exoatmElevation * (s3)
-		else:
-			refractionCorrection = -20.774 / te
+SUN_PATH_GROUP = "Lumiere sun path"
+SUN_STUDY_MARKER = "Sun study "
+
+def bake_fcurve(id_data, data_path, index, frames, values):
+	"""Replace the animation of a property by one keyframe per frame, written in one call"""
+
+	if id_data.animation_data is None:
+		id_data.animation_data_create()
+	if id_data.animation_data.action is None:
+		id_data.animation_data.action = bpy.data.actions.new(id_data.name + "_Lumiere")
+	action = id_data.animation_data.action
+
+	fcurve = action.fcurves.find(data_path, index=index)
+	if fcurve is not None:
+		action.fcurves.remove(fcurve)
+	fcurve = action.fcurves.new(data_path, index=index, action_group=SUN_PATH_GROUP)
+
+	co = np.empty(2 * len(frames))
+	co[0::2] = frames
+	co[1::2] = values
+	fcurve.keyframe_points.add(len(frames))
+	fcurve.keyframe_points.foreach_set("co", co)
+	fcurve.update()
+
+	return fcurve
+
+def clear_baked_fcurves():
+	"""Remove all the fcurves baked by bake_fcurve, and the actions left empty"""
+	for action in list(bpy.data.actions):
+		baked = [fc for fc in action.fcurves if fc.group is not None and fc.group.name == SUN_PATH_GROUP]
+		for fcurve in baked:
+			action.fcurves.remove(fcurve)
+		if baked and not action.fcurves:
+			bpy.data.actions.remove(action)
+
+def bake_sun_states(scene, frames, locations, rotations):
+	"""Bake sun states, one per frame, on the sky and the linked light"""
+
+	light = scene.Lumiere.link_to_light
+	directions = sun_directions(rotations)
+	#4000 -> HORIZON // 5780 -> Daylight
+	temperatures = 4000 + (1780 * directions[:, 2])
+
+	world_tree = bpy.data.worlds['Lumiere_world'].node_tree
+	for i in range(3):
+		bake_fcurve(world_tree, 'nodes["Sky Texture"].sun_direction', i, frames, directions[:, i])
+		bake_fcurve(world_tree, 'nodes["Sun normal"].outputs[0].default_value', i, frames, directions[:, i])
+	bake_fcurve(world_tree, 'nodes["Blackbody"].inputs[0].default_value', 0, frames, temperatures)
 
-		refractionCorrection = refractionCorrection / 3600
-
-	solarElevation = 90.0 - degrees(zenith)
-
-	solarAzimuth = azimuth + northOffset
-
-	Sun_AzNorth = solarAzimuth
-
-	Sun_Theta = pi / 2 - radians(solarElevation)
-	Sun_Phi = radians(solarAzimuth) * -1
-
-	location = setSunPosition(Sun_Theta, Sun_Phi, distance)
-
-	rotation = ((radians(solarElevation - 90), 0, radians(-solarAzimuth)))
-
-	return location, rotation
+	if light is not None:
+		light.Lumiere.light_mode = "Sky"
+		for i in range(3):
+			bake_fcurve(light, "location", i, frames, locations[:, i])
+			bake_fcurve(light, "rotation_euler", i, frames, rotations[:, i])
 
-def setSunPosition(Sun_Theta, Sun_Phi, distance = 1):
+		mat = get_mat_name(light)
+		if mat is not None and mat.node_tree is not None and "Blackbody" in mat.node_tree.nodes:
+			bake_fcurve(mat.node_tree, 'nodes["Blackbody"].inputs[0].default_value', 0, frames, temperatures)
 
-	locX = sin(Sun_Phi) * sin(-Sun_Theta) * distance
-	locY = sin(Sun_Theta) * cos(Sun_Phi) * distance
-	locZ = cos(Sun_Theta) * distance
-
-	try:
-		return (locX, locY, locZ)
-	except:
-		pass
-
-
-def sunDeclination(e, L):
-	return (asin(sin(e) * sin(L)))
-
-
-def calcEquationOfTime(t):
-	epsilon = obliquityCorrection(t)
-	ml = radians(meanLongitudeSun(t))
-	e = eccentricityEarthOrbit(t)
-	m = radians(meanAnomalySun(t))
-	y = tan(radians(epsilon) / 2.0)
-	y = y * y
-	sin2ml = sin(2.0 * ml)
-	cos2ml = cos(2.0 * ml)
-	sin4ml = sin(4.0 * ml)
-	sinm = sin(m)
-	sin2m = sin(2.0 * m)
-	etime = (y * sin2ml - 2.0 * e * sinm + 4.0 * e * y *
-			 sinm * cos2ml - 0.5 * y ** 2 * sin4ml - 1.25 * e ** 2 * sin2m)
-	return (degrees(etime) * 4)
-
-def obliquityCorrection(t):
-	ec = obliquityOfEcliptic(t)
-	omega = 125.04 - 1934.136 * t
-	return (ec + 0.00256 * cos(radians(omega)))
-
-def obliquityOfEcliptic(t):
-	return ((23.0 + 26.0 / 60 + (21.4480 - 46.8150) / 3600 * t -
-			(0.00059 / 3600) * t ** 2 + (0.001813 / 3600) * t ** 3))
-
-def julianTimeFromY2k(utcTime, year, month, day):
-	century = 36525.0  # Days in Julian Century
-	epoch = 2451545.0  # Julian Day for 1/1/2000 12:00 gmt
-	jd = getJulianDay(year, month, day)
-	return ((jd + (utcTime / 24)) - epoch) / century
-
-def getJulianDay(year, month, day):
-	if month <= 2:
-		year -= 1
-		month += 12
-	A = floor(year / 100)
-	B = 2 - A + floor(A / 4.0)
-	jd = (floor((365.25 * (year + 4716.0))) +
-		 floor(30.6001 * (month + 1)) + day + B - 1524.5)
-	return jd
-
-def apparentLongitudeOfSun(t):
-	return (radians(trueLongitudeOfSun(t) - 0.00569 - 0.00478 *
-			sin(radians(125.04 - 1934.136 * t))))
-
-
-def trueLongitudeOfSun(t):
-	return (meanLongitudeSun(t) + equationOfSunCenter(t))
-
-def meanLongitudeSun(t):
-	return (280.46646 + 36000.76983 * t + 0.0003032 * t ** 2) % 360
-
-
-def eccentricityEarthOrbit(t):
-	return (0.016708634 - 0.000042037 * t - 0.0000001267 * t ** 2)
-
-def equationOfSunCenter(t):
-	m = radians(meanAnomalySun(t))
-	c = ((1.914602 - 0.004817 * t - 0.000014 * t ** 2) * sin(m) +
-		(0.019993 - 0.000101 * t) * sin(m * 2) +
-		 0.000289 * sin(m * 3))
-	return c
-
-def meanAnomalySun(t):
-	return (357.52911 + t * (35999.05029 - 0.0001537 * t))
+def clear_sun_study_markers(scene):
+	"""Remove the timeline markers of a sun study"""
+	for marker in [m for m in scene.timeline_markers if m.name.startswith(SUN_STUDY_MARKER)]:
+		scene.timeline_markers.remove(marker)
 
 # -------------------------------------------------------------------- #
 def update_sky(self, context, sun_direction, light = None):
+	"""Point the sky and its sun normal to the sun rotation.
+	Only the values that changed are written, each write updates the world shader"""
 
 	# Credits : https://www.youtube.com/watch?v=YXso7kNzxIU
-	xAng = sun_direction[0]
-	yAng = sun_direction[1]
-	zAng = sun_direction[2]
-
-	vec = Vector((0.0,0.0,1.0))
-	xMat = Matrix(((1.1,0.0,0.0), (0.0, cos(xAng), -sin(xAng)), (0.0, sin(xAng), cos(xAng))))
-	yMat = Matrix(((cos(yAng), 0.0, sin(yAng)), (0.0, 1.0, 0.0), (-sin(yAng), 0.0, cos(yAng))))
-	zMat = Matrix(((cos(zAng), -sin(zAng), 0.0), (sin(zAng), cos(zAng), 0.0), (0.0, 0.0, 1.0)))
-
-	vec = xMat @ vec
-	vec = yMat @ vec
-	vec = zMat @ vec
-
-	bpy.data.worlds['Lumiere_world'].node_tree.nodes['Sky Texture'].sun_direction = vec
-	bpy.data.worlds['Lumiere_world'].node_tree.nodes['Sun normal'].outputs[0].default_value = vec
-	bpy.data.worlds['Lumiere_world'].node_tree.nodes['Blackbody'].inputs[0].default_value = 4000 + (1780 * vec.z)
-
-	if light is not None:
-		mat = get_mat_name(light)
-
-		blackbody = mat.node_tree.nodes['Blackbody']
-		#4000 -> HORIZON // 5780 -> Daylight
-		light.Lumiere.blackbody = 4000 + (1780 * vec.z)
+	# Z axis rotated by the XYZ euler of the sun, in closed form
+	sx, sy, sz = sin(sun_direction[0]), sin(sun_direction[1]), sin(sun_direction[2])
+	cx, cy, cz = cos(sun_direction[0]), cos(sun_direction[1]), cos(sun_direction[2])
+	vec = Vector((cz * sy * cx + sz * sx, sz * sy * cx - cz * sx, cy * cx))
+	#4000 -> HORIZON // 5780 -> Daylight
+	temperature = 4000 + (1780 * vec.z)
+
+	nodes = sky_nodes.get()
+	if nodes is not None:
+		if nodes.sky is not None and (Vector(nodes.sky.sun_direction) - vec).length > 1e-6:
+			nodes.sky.sun_direction = vec
+		if nodes.normal is not None and (Vector(nodes.normal.outputs[0].default_value) - vec).length > 1e-6:
+			nodes.normal.outputs[0].default_value = vec
+		if nodes.blackbody is not None and abs(nodes.blackbody.inputs[0].default_value - temperature) > 0.01:
+			nodes.blackbody.inputs[0].default_value = temperature
+
+	if light is not None and abs(light.Lumiere.blackbody - temperature) > 0.01:
+		light.Lumiere.blackbody = temperature